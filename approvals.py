@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from config import APPROVAL_CONCURRENCY, APPROVAL_RATE, APPROVAL_MAX_RETRIES
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# So'rov natijalari
+APPROVED = "approved"
+DECLINED = "declined"
+FAILED = "failed"
+DROPPED = "dropped"
+
+# So'rovlar bilan amallar: Bot API metodi va muvaffaqiyatli natija
+APPROVE = "approve"
+DECLINE = "decline"
+ACTIONS = {
+    APPROVE: ("approve_chat_join_request", APPROVED),
+    DECLINE: ("decline_chat_join_request", DECLINED),
+}
+
+# Qayta urinish befoyda bo'lgan xatolar (foydalanuvchi allaqachon qo'shilgan,
+# so'rovni qaytarib olgan va h.k.)
+PERMANENT_ERRORS = (
+    "hide_requester_missing",
+    "user_already_participant",
+    "user_channels_too_much",
+    "input_user_deactivated",
+    "user_id_invalid",
+    "user not found",
+)
+
+class TokenBucket:
+    """Token-bucket tezlik cheklagichi (bot bo'yicha umumiy)"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Flood-wait: barcha so'rovlarni seconds davomida to'xtatish"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+class ApprovalResult:
+    """Qabul qilish natijasi"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.approved: List[int] = []
+        self.declined: List[int] = []
+        self.failed: List[int] = []
+        self.dropped: List[int] = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add(self, user_id: int, outcome: str):
+        {
+            APPROVED: self.approved,
+            DECLINED: self.declined,
+            FAILED: self.failed,
+            DROPPED: self.dropped,
+        }[outcome].append(user_id)
+
+    @property
+    def rate(self) -> float:
+        """Soniyasiga qayta ishlangan so'rovlar"""
+        elapsed = self.elapsed or (time.monotonic() - self.started)
+        done = len(self.approved) + len(self.declined) + len(self.failed) + len(self.dropped)
+        return done / elapsed if elapsed > 0 else 0.0
+
+    def handled_statuses(self) -> Dict[int, str]:
+        """Saqlash uchun yakuniy statuslar
+
+        Vaqtinchalik xato bilan tugaganlar kutilayotganligicha qoladi,
+        keyingi urinishda yana qayta ishlanadi.
+        """
+        statuses = {user_id: APPROVED for user_id in self.approved}
+        statuses.update((user_id, DECLINED) for user_id in self.declined)
+        statuses.update((user_id, DROPPED) for user_id in self.dropped)
+        return statuses
+
+class ApprovalEngine:
+    """Join so'rovlarni parallel va tezlik cheklovi bilan qabul qilish (yoki rad etish)
+
+    Qabul va rad etish bitta token-bucket dan o'tadi - ikkalasi ham bir xil
+    Bot API limitiga tushadi.
+    """
+
+    def __init__(self, bot: Bot, concurrency: int = APPROVAL_CONCURRENCY,
+                 rate: float = APPROVAL_RATE, max_retries: int = APPROVAL_MAX_RETRIES):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+
+    @staticmethod
+    def is_permanent(error: Exception) -> bool:
+        message = str(error).lower()
+        return any(marker in message for marker in PERMANENT_ERRORS)
+
+    async def _handle_one(self, chat_id: int, user_id: int, action: str = APPROVE) -> str:
+        method, success = ACTIONS[action]
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await getattr(self.bot, method)(chat_id=chat_id, user_id=user_id)
+                return success
+            except RetryAfter as e:
+                # Flood-wait urinish hisoblanmaydi, faqat kutiladi
+                logger.warning(f"Flood-wait {e.retry_after} s (foydalanuvchi {user_id})")
+                self.bucket.pause(float(e.retry_after))
+                Metrics.inc("approval_flood_waits_total")
+                Metrics.inc("approval_flood_wait_seconds_total", float(e.retry_after))
+            except BadRequest as e:
+                if self.is_permanent(e):
+                    logger.info(f"So'rov tashlab yuborildi {user_id}: {e}")
+                    return DROPPED
+                logger.error(f"So'rovni qayta ishlashda xato ({action}) {user_id}: {e}")
+                return FAILED
+            except NetworkError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"So'rovni qayta ishlashda xato ({action}) {user_id}: {e}")
+                    return FAILED
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt))
+            except Exception as e:
+                logger.error(f"So'rovni qayta ishlashda xato ({action}) {user_id}: {e}")
+                return FAILED
+
+    async def run(self, channel_id: str, user_ids: List[int], action: str = APPROVE) -> ApprovalResult:
+        result = ApprovalResult(len(user_ids))
+        pending = iter(user_ids)
+
+        async def worker():
+            # Umumiy iterator: har bir foydalanuvchi faqat bitta worker ga tushadi
+            for user_id in pending:
+                outcome = await self._handle_one(int(channel_id), user_id, action)
+                result.add(user_id, outcome)
+                Metrics.inc("approvals_total", outcome=outcome)
+
+        workers = max(1, min(self.concurrency, len(user_ids)))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        result.elapsed = time.monotonic() - result.started
+        logger.info(
+            f"Kanal {channel_id}: {len(result.approved)} qabul, {len(result.declined)} rad, "
+            f"{len(result.failed)} xato, {len(result.dropped)} tashlab yuborildi, "
+            f"{result.rate:.1f} ta/s"
+        )
+        return result
+
+    async def approve(self, channel_id: str, user_ids: List[int]) -> ApprovalResult:
+        return await self.run(channel_id, user_ids, APPROVE)
+
+    async def decline(self, channel_id: str, user_ids: List[int]) -> ApprovalResult:
+        return await self.run(channel_id, user_ids, DECLINE)
@@ -0,0 +1,389 @@
+"""Saqlash qatlami va handlerlar uchun benchmark
+
+Sintetik join so'rovlar (kanallar bo'yicha notekis, 30 kunga yoyilgan)
+yaratiladi va har bir holat alohida jarayonda, vaqtinchalik papkada o'lchanadi.
+Natija JSON ko'rinishida chiqadi - regressiyalarni va saqlash turlarini
+solishtirish uchun.
+
+--multiprocess N bilan bitta papkaga N ta jarayon bir vaqtda join so'rov
+yozadi va yangi jarayonda har bir yozuv saqlangani tekshiriladi.
+
+Ishlatish:
+    python bench.py
+    python bench.py --backends json,sqlite --requests 10000,1000000 --channels 1,200 -o bench.json
+    python bench.py --multiprocess 4 --requests 200000 --channels 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+# Benchmark paytida handlerlar logi o'lchovga aralashmasin
+logging.basicConfig(level=logging.WARNING)
+
+# Join so'rovlar shuncha kunga yoyiladi
+DATASET_DAYS = 30
+
+# Yozish tezligi shuncha yangi so'rovda o'lchanadi (UserManager.add_join_request)
+INGEST_SAMPLE = 20000
+
+# O'qish o'lchovlari shuncha marta takrorlanadi
+READ_REPEATS = 50
+
+# Kutilayotgan so'rovlarning shuncha qismi qabul qilingan deb belgilanadi
+APPROVED_RATIO = 0.5
+
+# Statuslar shuncha foydalanuvchidan iborat paketlarda yangilanadi
+STATUS_BATCH = 1000
+
+def channel_ids(count: int) -> List[str]:
+    return [str(-1001000000000 - index) for index in range(count)]
+
+def generate_requests(total: int, channels: List[str], seed: int = 1,
+                      days: int = DATASET_DAYS) -> Iterator[Tuple[int, str, datetime]]:
+    """Sintetik join so'rovlar vaqt bo'yicha: (user_id, channel_id, vaqt)
+
+    Kanallar Zipf ga yaqin taqsimlangan - bitta band kanal va ko'p sokin
+    kanallar; foydalanuvchilar takrorlanmaydi.
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(channels))]
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / max(1, total)
+
+    chunk = 10000
+    for offset in range(0, total, chunk):
+        size = min(chunk, total - offset)
+        picked = rng.choices(channels, weights, k=size)
+        for index, channel_id in enumerate(picked):
+            number = offset + index
+            user_id = 100000000 + number * 7 + rng.randrange(7)
+            yield user_id, channel_id, start + timedelta(seconds=number * step)
+
+def timed(func, repeats: int) -> Dict[str, float]:
+    """func ni repeats marta chaqirib, kechikish foizliklari (ms)"""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return latency_summary(samples)
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))], 4)
+
+    return {
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(samples[-1], 4),
+    }
+
+class FakeQuery:
+    """show_channel_details uchun CallbackQuery o'rnini bosuvchi"""
+
+    def get_bot(self):
+        return None
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.text = text
+
+def run_case(backend: str, total: int, channel_count: int, seed: int) -> dict:
+    """Bitta holatni joriy (bo'sh) papkada o'lchash"""
+    import storage
+    from storage import ChannelManager, UserManager, close_storage, get_storage
+
+    storage.STORAGE_BACKEND = backend
+    channels = channel_ids(channel_count)
+    metrics = {}
+
+    # Kanallar fayllari
+    started = time.perf_counter()
+    for channel_id in channels:
+        ChannelManager.save_channel_data(channel_id, {
+            "id": int(channel_id),
+            "title": f"Kanal {channel_id}",
+            "username": None,
+            "is_bot_admin": True,
+            "added_date": datetime.now().isoformat()
+        })
+    metrics["channel_save_per_s"] = round(channel_count / (time.perf_counter() - started), 1)
+
+    # Ma'lumotlar to'plami (tarixiy vaqtlar bilan, to'g'ridan-to'g'ri saqlash qatlamiga)
+    backend_storage = get_storage()
+    started = time.perf_counter()
+    for user_id, channel_id, timestamp in generate_requests(total, channels, seed):
+        backend_storage.add_join_request(user_id, channel_id, timestamp)
+    backend_storage.flush()
+    metrics["populate_per_s"] = round(total / (time.perf_counter() - started), 1)
+
+    # Eng eski so'rovlarning bir qismini qabul qilingan deb belgilash
+    handled = 0
+    started = time.perf_counter()
+    for channel_id in channels:
+        pending = backend_storage.get_join_requests(channel_id)
+        approved = pending[:int(len(pending) * APPROVED_RATIO)]
+        for offset in range(0, len(approved), STATUS_BATCH):
+            batch = approved[offset:offset + STATUS_BATCH]
+            backend_storage.set_statuses(channel_id, {user_id: "approved" for user_id in batch})
+        handled += len(approved)
+    backend_storage.flush()
+    elapsed = time.perf_counter() - started
+    metrics["set_statuses_per_s"] = round(handled / elapsed, 1) if handled else None
+
+    # Qayta ishga tushish: diskdan yuklash va indekslarni qurish
+    close_storage()
+    started = time.perf_counter()
+    backend_storage = get_storage()
+    metrics["startup_s"] = round(time.perf_counter() - started, 4)
+
+    # Yozish tezligi (handler yo'li: saqlash + indeks + hisoblagichlar)
+    sample = min(INGEST_SAMPLE, max(1000, total // 10))
+    base_user = 10 ** 12
+    started = time.perf_counter()
+    for index in range(sample):
+        UserManager.add_join_request(base_user + index, channels[index % channel_count])
+    backend_storage.flush()
+    metrics["add_join_request_per_s"] = round(sample / (time.perf_counter() - started), 1)
+
+    # O'qish kechikishi eng band kanalda (generate_requests da birinchi kanal)
+    busiest = channels[0]
+    metrics["busiest_channel_pending"] = UserManager.count_join_requests(busiest)
+    for name, time_range in (("all", None), ("1d", timedelta(days=1)), ("7d", timedelta(days=7))):
+        metrics[f"get_join_requests_{name}"] = timed(
+            lambda: UserManager.get_join_requests(busiest, time_range), READ_REPEATS
+        )
+        metrics[f"storage_get_join_requests_{name}"] = timed(
+            lambda: backend_storage.get_join_requests(busiest, time_range),
+            max(3, READ_REPEATS // 10)
+        )
+
+    # Kanallar ro'yxati: keshdan va manbadan (indeks fayli / jadval)
+    metrics["get_all_channels_cached"] = timed(ChannelManager.get_all_channels, READ_REPEATS)
+    metrics["get_all_channels_cold"] = timed(
+        backend_storage.load_channel_index, max(3, READ_REPEATS // 10)
+    )
+
+    # show_channel_details statistikasi (admin holati keshdan)
+    import bot
+    bot.BotAdminCache.set(busiest, True)
+    query = FakeQuery()
+    loop = asyncio.new_event_loop()
+    try:
+        metrics["show_channel_details"] = timed(
+            lambda: loop.run_until_complete(bot.show_channel_details(query, busiest)),
+            READ_REPEATS
+        )
+    finally:
+        loop.close()
+
+    close_storage()
+    storage._io_executor.shutdown(wait=True)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Linux da ru_maxrss KB da, macOS da baytda
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    metrics["peak_rss_mb"] = round(usage.ru_maxrss / divisor, 1)
+
+    disk = sum(file.stat().st_size for file in Path(".").rglob("*") if file.is_file())
+    metrics["disk_mb"] = round(disk / 1024 / 1024, 2)
+
+    return {"backend": backend, "requests": total, "channels": channel_count, "metrics": metrics}
+
+def writer_user_id(worker: int, index: int) -> int:
+    return (worker + 1) * 10 ** 9 + index
+
+def run_writer(backend: str, worker: int, count: int, channel_count: int) -> dict:
+    """Ko'p jarayonli sinov yozuvchisi: joriy papkaga count ta join so'rov"""
+    import storage
+    from storage import UserManager, close_storage, get_storage
+
+    storage.STORAGE_BACKEND = backend
+    channels = channel_ids(channel_count)
+    get_storage()
+    started = time.perf_counter()
+    for index in range(count):
+        UserManager.add_join_request(writer_user_id(worker, index), channels[index % channel_count])
+    close_storage()
+    return {"worker": worker, "duration_s": round(time.perf_counter() - started, 3)}
+
+def run_verify(backend: str, processes: int, count: int, channel_count: int) -> dict:
+    """Barcha yozuvchilar so'rovlari saqlanganini yangi jarayonda tekshirish"""
+    import storage
+    from storage import close_storage, get_storage
+
+    storage.STORAGE_BACKEND = backend
+    channels = channel_ids(channel_count)
+    expected = {
+        (writer_user_id(worker, index), channels[index % channel_count])
+        for worker in range(processes) for index in range(count)
+    }
+    stored = [(user_id, channel_id) for user_id, channel_id, _, _ in get_storage().iter_join_requests()]
+    close_storage()
+    return {
+        "expected": len(expected),
+        "stored": len(stored),
+        "missing": len(expected - set(stored)),
+        "duplicates": len(stored) - len(set(stored)),
+    }
+
+def run_multiprocess(backend: str, processes: int, total: int, channel_count: int) -> dict:
+    """processes ta jarayon bitta vaqtinchalik papkaga bir vaqtda yozadi"""
+    count = total // processes
+    result = {"backend": backend, "processes": processes, "requests": count * processes,
+              "channels": channel_count}
+    workdir = tempfile.mkdtemp(prefix="accepter-bench-mp-")
+    script = str(Path(__file__).resolve())
+    env = dict(os.environ, STORAGE_BACKEND=backend, STORAGE_MULTIPROCESS="1",
+               PYTHONPATH=str(Path(__file__).resolve().parent))
+    try:
+        started = time.perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, script, "--writer", f"{backend}:{worker}:{count}:{channel_count}"],
+                cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            )
+            for worker in range(processes)
+        ]
+        errors = []
+        for worker in workers:
+            _, stderr = worker.communicate()
+            if worker.returncode != 0:
+                errors.extend(stderr.strip().splitlines()[-1:] or ["noma'lum xato"])
+        elapsed = time.perf_counter() - started
+        result["duration_s"] = round(elapsed, 3)
+        result["ingest_per_s"] = round(count * processes / elapsed, 1)
+        if errors:
+            result["error"] = errors
+            return result
+
+        output = subprocess.run(
+            [sys.executable, script, "--verify", f"{backend}:{processes}:{count}:{channel_count}"],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            result["error"] = output.stderr.strip().splitlines()[-1:] or ["noma'lum xato"]
+            return result
+        result.update(json.loads(output.stdout.strip().splitlines()[-1]))
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_case_process(backend: str, total: int, channel_count: int, seed: int) -> dict:
+    """Holatni yangi jarayonda va vaqtinchalik papkada ishga tushirish
+
+    Modullar holati (keshlar, indekslar) va xotira o'lchovi holatlar
+    orasida aralashmasligi uchun.
+    """
+    workdir = tempfile.mkdtemp(prefix="accepter-bench-")
+    try:
+        env = dict(os.environ, STORAGE_BACKEND=backend, PYTHONPATH=str(Path(__file__).resolve().parent))
+        output = subprocess.run(
+            [
+                sys.executable, str(Path(__file__).resolve()), "--case",
+                f"{backend}:{total}:{channel_count}", "--seed", str(seed)
+            ],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            return {
+                "backend": backend, "requests": total, "channels": channel_count,
+                "error": output.stderr.strip().splitlines()[-1:] or ["noma'lum xato"]
+            }
+        return json.loads(output.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(float(item)) for item in value.split(",") if item]
+
+def main():
+    parser = argparse.ArgumentParser(description="Saqlash qatlami va handlerlar benchmarki")
+    parser.add_argument("--backends", default="json,sqlite",
+                        help="saqlash turlari, vergul bilan (json,sqlite)")
+    parser.add_argument("--requests", type=parse_int_list, default=[10000, 100000],
+                        help="so'rovlar soni, vergul bilan (masalan 10000,1000000,5e6)")
+    parser.add_argument("--channels", type=parse_int_list, default=[1, 50],
+                        help="kanallar soni, vergul bilan (masalan 1,200)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--multiprocess", type=int, default=0, metavar="N",
+                        help="N ta jarayon bitta papkaga bir vaqtda yozadi (so'rovlar ular orasida bo'linadi)")
+    parser.add_argument("-o", "--output", help="natija fayli (ko'rsatilmasa stdout)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--writer", help=argparse.SUPPRESS)
+    parser.add_argument("--verify", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer:
+        backend, worker, count, channel_count = args.writer.split(":")
+        result = run_writer(backend, int(worker), int(count), int(channel_count))
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    if args.verify:
+        backend, processes, count, channel_count = args.verify.split(":")
+        result = run_verify(backend, int(processes), int(count), int(channel_count))
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    if args.case:
+        # Ichki rejim: bitta holat joriy papkada, natija oxirgi qatorda
+        backend, total, channel_count = args.case.split(":")
+        result = run_case(backend, int(total), int(channel_count), args.seed)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    results = []
+    backends = args.backends.split(",")
+    if args.multiprocess and "sqlite" in backends:
+        # SQLite bitta jarayon uchun (SqliteStorage ikkinchi jarayonni rad etadi)
+        print("--multiprocess: sqlite o'tkazib yuborildi (faqat json)", file=sys.stderr)
+        backends.remove("sqlite")
+    for backend in backends:
+        for total in args.requests:
+            for channel_count in args.channels:
+                print(f"{backend}: {total} so'rov, {channel_count} kanal...", file=sys.stderr)
+                if args.multiprocess:
+                    results.append(run_multiprocess(backend, args.multiprocess, total, channel_count))
+                else:
+                    results.append(run_case_process(backend, total, channel_count, args.seed))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    # Ko'p jarayonli sinov: yo'qolgan yoki takrorlangan yozuv - xato (exit 1)
+    failed = [
+        result for result in results
+        if result.get("error") or result.get("missing") or result.get("duplicates")
+    ] if args.multiprocess else []
+    if failed:
+        print(f"XATO: {len(failed)} ta holatda yozuvlar yo'qoldi yoki takrorlandi", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
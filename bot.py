@@ -1,10 +1,10 @@
-import json
-import os
+import asyncio
 import logging
+import re
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import random
-from pathlib import Path
 
 from telegram import (
     Update, 
@@ -14,15 +14,43 @@ from telegram import (
     Chat,
     User
 )
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    ChatJoinRequestHandler,
+    ChatMemberHandler,
     MessageHandler,
     ContextTypes,
     filters
 )
 
+from approvals import DECLINE, ApprovalEngine
+from exports import export_channel_requests
+from jobs import (
+    LEADER_RETRY_INTERVAL,
+    AutoApproveScheduler,
+    JobManager,
+    LeaderLock,
+    RetentionScheduler,
+    get_auto_approve_policy
+)
+from config import (
+    BOT_API_URL,
+    METRICS_LISTEN,
+    METRICS_PORT,
+    RUN_MODE,
+    UPDATE_WORKERS,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_URL_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET
+)
+from metrics import Metrics, MetricsServer
+from storage import ChannelManager, UserManager, close_storage, get_storage, run_io
+
 # Logging konfiguratsiyasi
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -34,107 +62,189 @@ logger = logging.getLogger(__name__)
 ADMIN_IDS = [123456789]  # Admin ID larini o'zgartiring
 BOT_TOKEN = "YOUR_BOT_TOKEN_HERE"
 
-# Papkalar
-CHANNELS_DIR = Path("channels")
-CHANNELS_DIR.mkdir(exist_ok=True)
-
-# Foydalanuvchilar uchun JSON fayl
-USERS_FILE = "users.json"
-
 # Vaqt oralig'lari
 ONE_DAY = timedelta(days=1)
 ONE_MONTH = timedelta(days=30)
 
-class ChannelManager:
-    """Kanal ma'lumotlarini boshqarish"""
-    
-    @staticmethod
-    def get_channel_file(channel_id: str) -> Path:
-        return CHANNELS_DIR / f"{channel_id}.json"
-    
-    @staticmethod
-    def save_channel_data(channel_id: str, data: dict):
-        file_path = ChannelManager.get_channel_file(channel_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    @staticmethod
-    def load_channel_data(channel_id: str) -> Optional[dict]:
-        file_path = ChannelManager.get_channel_file(channel_id)
-        if file_path.exists():
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
-    
-    @staticmethod
-    def get_all_channels() -> List[dict]:
-        channels = []
-        for file in CHANNELS_DIR.glob("*.json"):
-            with open(file, 'r', encoding='utf-8') as f:
-                channels.append(json.load(f))
-        return channels
-    
-    @staticmethod
-    def delete_channel(channel_id: str):
-        file_path = ChannelManager.get_channel_file(channel_id)
-        if file_path.exists():
-            file_path.unlink()
+# Bot qayta ishlaydigan yangilanish turlari (qolganlari Telegram tomonidan yuborilmaydi)
+ALLOWED_UPDATES = [
+    Update.MESSAGE,
+    Update.CALLBACK_QUERY,
+    Update.CHAT_JOIN_REQUEST,
+    Update.MY_CHAT_MEMBER,
+    # Kanal a'zolari o'zgarishi (bot kanal admini bo'lganda keladi)
+    Update.CHAT_MEMBER,
+]
+
+# Bir vaqtda olingan (navbatda turgan va ishlayotgan) yangilanishlar chegarasi,
+# undan oshganlari update_queue da kutadi
+UPDATE_BACKLOG = 4096
+
+# /stats da har bir bo'limda shuncha qator ko'rsatiladi
+STATS_TOP = 8
+
+# Admin tugmalari va xabarlaridagi kanal ID si (callback_data ichida ham)
+CHANNEL_ID_PATTERN = re.compile(r"-100\d+")
+
+# Kanalda vazifa ishlayotganda yangisi boshlanmaydi
+JOB_BUSY_TEXT = "⏳ Bu kanalda boshqa vazifa bajarilmoqda! U tugagach qayta urinib ko'ring."
+
+# Bot adminligi keshi shuncha soniyadan keyin API orqali qayta tekshiriladi
+ADMIN_CACHE_TTL = 600
+
+# Avtomatik qabul sozlamalari tugmalari shu qiymatlar bo'yicha aylanadi
+AUTO_RATE_PRESETS = [(5, "minute"), (20, "minute"), (60, "minute"), (100, "hour"), (500, "hour")]
+QUIET_HOURS_PRESETS = [None, [0, 7], [23, 8], [22, 9]]
+
+# Ro'yxatlar sahifalari hajmi (Telegram klaviatura chegarasidan ancha kichik)
+CHANNELS_PAGE_SIZE = 10
+PENDING_PAGE_SIZE = 20
+
+# Eski so'rovlarni rad etish: shuncha kundan oldin kelgan so'rovlar
+DECLINE_AGE_PRESETS = [3, 7, 30, 90]
+
+# Foydalanuvchi kanalga qo'shilganda / chiqib ketganda so'rovi shu status bilan yopiladi
+JOINED_MEMBER_STATUSES = [
+    ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER, ChatMember.RESTRICTED
+]
+LEFT_MEMBER_STATUSES = [ChatMember.LEFT, ChatMember.BANNED]
+
+# Soatlik grafik uchun belgilar
+HISTOGRAM_BARS = "▁▂▃▄▅▆▇█"
+
+def format_histogram(values: List[int]) -> str:
+    """Soatlik qiymatlarni matnli grafikka aylantirish"""
+    peak = max(values, default=0)
+    if peak <= 0:
+        return HISTOGRAM_BARS[0] * len(values)
+    top = len(HISTOGRAM_BARS) - 1
+    return "".join(HISTOGRAM_BARS[max(0, value) * top // peak] for value in values)
+
+class BotAdminCache:
+    """Bot kanalda adminmi - my_chat_member yangilanishlari bilan yuritiladi
+
+    Eskirgan (ADMIN_CACHE_TTL) yoki noma'lum kanal uchungina API ga murojaat qilinadi.
+    """
+
+    _entries: Dict[str, Tuple[bool, float]] = {}
 
-class UserManager:
-    """Foydalanuvchi ma'lumotlarini boshqarish"""
-    
-    @staticmethod
-    def load_users() -> Dict:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-    
     @staticmethod
-    def save_users(users_data: Dict):
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users_data, f, ensure_ascii=False, indent=2)
-    
+    def set(channel_id: str, is_admin: bool):
+        BotAdminCache._entries[channel_id] = (is_admin, time.monotonic())
+
     @staticmethod
-    def add_join_request(user_id: int, channel_id: str):
-        users_data = UserManager.load_users()
-        
-        if str(user_id) not in users_data:
-            users_data[str(user_id)] = {}
+    async def is_admin(bot, channel_id: str) -> bool:
+        """Xatolik bo'lsa (kanal topilmadi va h.k.) istisno ko'tariladi"""
+        entry = BotAdminCache._entries.get(channel_id)
+        if entry and time.monotonic() - entry[1] < ADMIN_CACHE_TTL:
+            return entry[0]
         
-        user_entry = users_data[str(user_id)]
-        if channel_id not in user_entry:
-            user_entry[channel_id] = []
-        
-        request_data = {
-            "timestamp": datetime.now().isoformat(),
-            "status": "pending"
-        }
-        user_entry[channel_id].append(request_data)
-        
-        # Faqat oxirgi 1000 ta so'rovni saqlash
-        if len(user_entry[channel_id]) > 1000:
-            user_entry[channel_id] = user_entry[channel_id][-1000:]
-        
-        UserManager.save_users(users_data)
+        bot_member = await bot.get_chat_member(
+            chat_id=int(channel_id),
+            user_id=bot.id
+        )
+        is_admin = bot_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+        BotAdminCache.set(channel_id, is_admin)
+        return is_admin
+
+class InstrumentedRequest(HTTPXRequest):
+    """Bot API chaqiruvlari: metod bo'yicha vaqt va xatolar (429 - flood-limit bosimi)"""
     
-    @staticmethod
-    def get_join_requests(channel_id: str, time_range: Optional[timedelta] = None) -> List[int]:
-        users_data = UserManager.load_users()
-        user_ids = []
-        
-        for user_id_str, channels in users_data.items():
-            if channel_id in channels:
-                for request in channels[channel_id]:
-                    if request["status"] == "pending":
-                        if time_range:
-                            request_time = datetime.fromisoformat(request["timestamp"])
-                            if datetime.now() - request_time <= time_range:
-                                user_ids.append(int(user_id_str))
-                        else:
-                            user_ids.append(int(user_id_str))
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            Metrics.inc("telegram_api_errors_total", method=api_method, code="network")
+            raise
+        finally:
+            Metrics.observe("telegram_api_seconds", time.perf_counter() - started, method=api_method)
         
-        return user_ids
+        if code >= 400:
+            Metrics.inc("telegram_api_errors_total", method=api_method, code=code)
+        return code, payload
+
+class OrderedApplication(Application):
+    """Yangilanishlarni parallel, bitta chat ichida esa kelish tartibida qayta ishlash
+
+    Kalit - yangilanish chati: join so'rovlar va a'zolar o'zgarishlari uchun
+    kanal. Kanal ustidagi admin amallari (callback_data dagi yoki kutilayotgan
+    kiritishdagi kanal ID si) va botning huquqlari o'zgarishi kanal ma'lumotlarini
+    o'qib-yozadi, shuning uchun ular kanalning alohida admin kalitida navbat bilan
+    bajariladi - ikki admin bitta kanalda parallel vazifa boshlay olmaydi, join
+    so'rovlar oqimi esa admin amallarini kutdirmaydi. Qolgan admin xabarlari
+    admin bilan shaxsiy chat bo'yicha.
+    Har xil kalitlar UPDATE_WORKERS tagacha bir vaqtda ishlaydi, shuning uchun
+    og'ir admin amali boshqa kanallar join so'rovlarini ushlab turmaydi;
+    bitta kanal yangilanishlari esa ketma-ket (saqlash tartibi buzilmaydi).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._update_slots = asyncio.Semaphore(UPDATE_WORKERS)
+        # Kalit bo'yicha navbat va undagi yangilanishlar soni (bo'shagach o'chiriladi)
+        self._update_locks: Dict[str, asyncio.Lock] = {}
+        self._update_waiting: Dict[str, int] = {}
+
+    def admin_channel(self, update: Update) -> Optional[str]:
+        """Admin tugmasi yoki xabari qaysi kanal ustida ishlaydi (bo'lmasa None)"""
+        if update.callback_query is not None:
+            match = CHANNEL_ID_PATTERN.search(update.callback_query.data or "")
+            return match.group() if match else None
+        if update.message is not None and update.message.text and update.effective_user:
+            text = update.message.text.strip()
+            if CHANNEL_ID_PATTERN.fullmatch(text):
+                return text
+            user_data = self.user_data.get(update.effective_user.id) or {}
+            return user_data.get('accept_count_channel')
+        return None
+
+    def update_key(self, update: object) -> Optional[str]:
+        if not isinstance(update, Update):
+            return None
+        if update.my_chat_member is not None:
+            return f"channel-admin:{update.my_chat_member.chat.id}"
+        channel_id = self.admin_channel(update)
+        if channel_id is not None:
+            return f"channel-admin:{channel_id}"
+        if update.effective_chat is not None:
+            return f"chat:{update.effective_chat.id}"
+        if update.effective_user is not None:
+            return f"user:{update.effective_user.id}"
+        return None
+
+    @staticmethod
+    def update_type(update: object) -> str:
+        if isinstance(update, Update):
+            for update_type in ALLOWED_UPDATES:
+                if getattr(update, update_type, None) is not None:
+                    return update_type
+        return "other"
+
+    async def process_update(self, update: object) -> None:
+        key = self.update_key(update)
+        if key is None:
+            async with self._update_slots:
+                await super().process_update(update)
+            return
+
+        lock = self._update_locks.get(key)
+        if lock is None:
+            lock = self._update_locks[key] = asyncio.Lock()
+        self._update_waiting[key] = self._update_waiting.get(key, 0) + 1
+        started = time.perf_counter()
+        try:
+            async with lock, self._update_slots:
+                Metrics.observe(
+                    "update_wait_seconds", time.perf_counter() - started, type=self.update_type(update)
+                )
+                await super().process_update(update)
+        finally:
+            self._update_waiting[key] -= 1
+            if not self._update_waiting[key]:
+                del self._update_waiting[key]
+                del self._update_locks[key]
 
 # Admin panel tugmalari
 def get_admin_main_keyboard():
@@ -156,10 +266,44 @@ def get_channel_keyboard(channel_id: str):
                               callback_data=f"accept_all_{channel_id}")],
         [InlineKeyboardButton("🔢 Son bo'yicha qabul qilish", 
                               callback_data=f"accept_count_{channel_id}")],
+        [InlineKeyboardButton("⏱ Avtomatik qabul", 
+                              callback_data=f"auto_{channel_id}")],
+        [InlineKeyboardButton("👥 Kutilayotganlar ro'yxati",
+                              callback_data=f"pending_{channel_id}")],
+        [InlineKeyboardButton("🗑 Eski so'rovlarni rad etish",
+                              callback_data=f"decline_{channel_id}")],
+        [InlineKeyboardButton("📤 Eksport (CSV)", callback_data=f"export_csv_{channel_id}"),
+         InlineKeyboardButton("📤 Eksport (JSONL)", callback_data=f"export_jsonl_{channel_id}")],
         [InlineKeyboardButton("❌ Bekor qilish", callback_data="cancel")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def format_auto_rate(policy: dict) -> str:
+    unit = "daqiqa" if policy['per'] == "minute" else "soat"
+    return f"{policy['rate']} ta/{unit}"
+
+def format_quiet_hours(policy: dict) -> str:
+    if not policy['quiet_hours']:
+        return "Yo'q"
+    start, end = policy['quiet_hours']
+    return f"{start:02d}:00 - {end:02d}:00"
+
+def get_auto_approve_keyboard(channel_id: str, policy: dict):
+    order_text = "Navbat bo'yicha" if policy['order'] == "fifo" else "Tasodifiy"
+    keyboard = [
+        [InlineKeyboardButton("⏸ O'chirish" if policy['enabled'] else "▶️ Yoqish",
+                              callback_data=f"auto_toggle_{channel_id}")],
+        [InlineKeyboardButton(f"⚡ Tezlik: {format_auto_rate(policy)}",
+                              callback_data=f"auto_rate_{channel_id}")],
+        [InlineKeyboardButton(f"🔀 Tartib: {order_text}",
+                              callback_data=f"auto_order_{channel_id}")],
+        [InlineKeyboardButton(f"🌙 Sokin soatlar: {format_quiet_hours(policy)}",
+                              callback_data=f"auto_quiet_{channel_id}")],
+        [InlineKeyboardButton("⬅️ Orqaga", callback_data=f"channel_{channel_id}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@Metrics.timed("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start komandasi"""
     user_id = update.effective_user.id
@@ -173,6 +317,91 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_admin_main_keyboard()
     )
 
+@Metrics.timed("compact_command")
+async def compact_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Eski so'rovlar tarixini darhol tozalash (/compact)"""
+    user_id = update.effective_user.id
+    
+    if user_id not in ADMIN_IDS:
+        await update.message.reply_text("Siz admin emassiz!")
+        return
+    
+    retention = context.application.bot_data['retention']
+    message = await update.message.reply_text("⏳ Tarix tozalanmoqda...")
+    
+    try:
+        removed, reclaimed = await retention.run_once()
+    except Exception as e:
+        logger.error(f"Tarixni tozalashda xato: {e}")
+        await message.edit_text("❌ Tarixni tozalashda xato yuz berdi!")
+        return
+    
+    await message.edit_text(
+        f"🧹 Tarix tozalandi!\n\n"
+        f"🗑 O'chirilgan yozuvlar: {removed}\n"
+        f"💾 Bo'shagan joy: {reclaimed / 1024:.1f} KB\n"
+        f"📅 Saqlash muddati: {retention.retention_days} kun"
+    )
+
+def format_latency_lines(histograms: Dict, limit: int = STATS_TOP) -> List[str]:
+    """Eng sekinlari birinchi: nomi, o'rtacha / p95 ms, soni"""
+    slowest = sorted(histograms.items(), key=lambda item: item[1].average, reverse=True)
+    return [
+        f"• {name}: {histogram.average * 1000:.1f} / {histogram.quantile(0.95) * 1000:.0f} ms "
+        f"({histogram.count} ta)"
+        for name, histogram in slowest[:limit]
+    ]
+
+@Metrics.timed("stats_command")
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ish vaqti o'lchovlari qisqacha (/stats)"""
+    user_id = update.effective_user.id
+    
+    if user_id not in ADMIN_IDS:
+        await update.message.reply_text("Siz admin emassiz!")
+        return
+    
+    uptime = int(Metrics.uptime())
+    api_errors: Dict[str, float] = {}
+    flood_errors = 0
+    for labels, value in Metrics.counters("telegram_api_errors_total").items():
+        labels = dict(labels)
+        api_errors[labels["method"]] = api_errors.get(labels["method"], 0) + value
+        if labels["code"] == "429":
+            flood_errors += value
+    
+    api_lines = [
+        f"• {method}: {histogram.average * 1000:.0f} ms, {histogram.count} ta, "
+        f"{int(api_errors.get(method, 0))} xato"
+        for method, histogram in sorted(
+            Metrics.histograms("telegram_api_seconds").items(),
+            key=lambda item: item[1].count, reverse=True
+        )[:STATS_TOP]
+    ]
+    
+    text = (
+        f"📈 Bot statistikasi\n\n"
+        f"⏱ Ish vaqti: {uptime // 3600} soat {uptime % 3600 // 60} daqiqa\n"
+        f"📥 Join so'rovlar: {int(Metrics.counter('join_requests_total'))} ta "
+        f"({Metrics.rate('join_requests'):.1f} ta/s)\n"
+        f"✅ Qabul qilingan: {int(Metrics.counter('approvals_total', outcome='approved'))}, "
+        f"rad etilgan: {int(Metrics.counter('approvals_total', outcome='declined'))}, "
+        f"xato: {int(Metrics.counter('approvals_total', outcome='failed'))}, "
+        f"tashlab yuborilgan: {int(Metrics.counter('approvals_total', outcome='dropped'))}\n"
+        f"🔄 Tashqarida hal bo'lgan: {int(Metrics.counter('reconciled_requests_total'))} ta\n"
+        f"🌊 Flood-wait: {int(Metrics.counter('approval_flood_waits_total'))} marta, "
+        f"429 javoblar: {int(flood_errors)}\n\n"
+        f"🐢 Handlerlar (o'rtacha / p95):\n"
+        + "\n".join(format_latency_lines(Metrics.histograms("handler_seconds")) or ["• -"])
+        + "\n\n📡 Bot API:\n"
+        + "\n".join(api_lines or ["• -"])
+        + "\n\n💾 Saqlash (o'rtacha / p95):\n"
+        + "\n".join(format_latency_lines(Metrics.histograms("storage_seconds")) or ["• -"])
+    )
+    
+    await update.message.reply_text(text)
+
+@Metrics.timed("button_callback")
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inline tugmalar uchun callback"""
     query = update.callback_query
@@ -194,6 +423,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "channels_list":
         await show_channels_list(query)
     
+    elif data.startswith("channels_"):
+        _, direction, cursor = data.split("_")
+        await show_channels_list(query, cursor, backward=direction == "prev")
+    
     elif data == "add_channel":
         await request_channel_id(query)
     
@@ -207,11 +440,46 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif data.startswith("accept_count_"):
         channel_id = data.split("_")[2]
-        await request_accept_count(query, channel_id)
+        await request_accept_count(query, channel_id, context)
+    
+    elif data.startswith("pending_"):
+        parts = data.split("_")
+        if len(parts) == 2:
+            await show_pending_users(query, parts[1])
+        else:
+            _, direction, channel_id, generation, row = parts
+            await show_pending_users(
+                query, channel_id, (int(generation), int(row)), backward=direction == "prev"
+            )
+    
+    elif data.startswith("decline_"):
+        parts = data.split("_")
+        if len(parts) == 2:
+            await show_decline_options(query, parts[1])
+        else:
+            await decline_stale_requests(query, parts[2], int(parts[1]), context)
+    
+    elif data.startswith("export_"):
+        _, fmt, channel_id = data.split("_")
+        await export_requests(query, channel_id, fmt)
+    
+    elif data.startswith("cancel_job_"):
+        job_id = data.split("_")[2]
+        await cancel_job(query, job_id, context)
+    
+    elif data.startswith("auto_"):
+        parts = data.split("_")
+        if len(parts) == 2:
+            await show_auto_approve_settings(query, parts[1])
+        else:
+            await update_auto_approve(query, parts[2], parts[1])
 
-async def show_channels_list(query):
-    """Ulangan kanallar ro'yxatini ko'rsatish"""
-    channels = ChannelManager.get_all_channels()
+@Metrics.timed("show_channels_list")
+async def show_channels_list(query, cursor: Optional[str] = None, backward: bool = False):
+    """Ulangan kanallar ro'yxatini sahifalab ko'rsatish (nom bo'yicha)"""
+    channels, start, total = await ChannelManager.get_channels_page_async(
+        cursor, backward, CHANNELS_PAGE_SIZE
+    )
     
     if not channels:
         keyboard = [[InlineKeyboardButton("❌ Bekor qilish", callback_data="cancel")]]
@@ -230,13 +498,27 @@ async def show_channels_list(query):
             callback_data=f"channel_{channel['id']}"
         )])
     
+    # Kursor - sahifaning chetki kanali, keyingi sahifa undan boshlanadi
+    navigation = []
+    if start > 0:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Oldingi", callback_data=f"channels_prev_{channels[0]['id']}"
+        ))
+    if start + len(channels) < total:
+        navigation.append(InlineKeyboardButton(
+            "Keyingi ➡️", callback_data=f"channels_next_{channels[-1]['id']}"
+        ))
+    if navigation:
+        buttons.append(navigation)
+    
     buttons.append([InlineKeyboardButton("❌ Bekor qilish", callback_data="cancel")])
     
     await query.edit_message_text(
-        "📊 Ulangan kanallar:",
+        f"📊 Ulangan kanallar ({start + 1}-{start + len(channels)} / {total}):",
         reply_markup=InlineKeyboardMarkup(buttons)
     )
 
+@Metrics.timed("request_channel_id")
 async def request_channel_id(query):
     """Kanal ID sini so'rash"""
     await query.edit_message_text(
@@ -248,6 +530,7 @@ async def request_channel_id(query):
         reply_markup=get_cancel_keyboard()
     )
 
+@Metrics.timed("process_channel_id")
 async def process_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Kanal ID sini qayta ishlash"""
     user_id = update.effective_user.id
@@ -271,12 +554,7 @@ async def process_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
             chat = await context.bot.get_chat(int(channel_id))
             
             # Bot adminligini tekshirish
-            bot_member = await context.bot.get_chat_member(
-                chat_id=int(channel_id),
-                user_id=context.bot.id
-            )
-            
-            is_admin = bot_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+            is_admin = await BotAdminCache.is_admin(context.bot, str(chat.id))
             
             keyboard = [
                 [
@@ -319,6 +597,7 @@ async def process_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=get_cancel_keyboard()
         )
 
+@Metrics.timed("confirm_channel")
 async def confirm_channel(query, channel_id: str, context: ContextTypes.DEFAULT_TYPE):
     """Kanalni qo'shishni tasdiqlash"""
     channel_data = context.user_data.get('pending_channel')
@@ -339,7 +618,7 @@ async def confirm_channel(query, channel_id: str, context: ContextTypes.DEFAULT_
         'is_bot_admin': channel_data['is_admin']
     }
     
-    ChannelManager.save_channel_data(channel_data['id'], save_data)
+    await ChannelManager.save_channel_data_async(channel_data['id'], save_data)
     
     await query.edit_message_text(
         f"✅ Kanal muvaffaqiyatli qo'shildi!\n\n"
@@ -350,9 +629,10 @@ async def confirm_channel(query, channel_id: str, context: ContextTypes.DEFAULT_
     # Vaqtincha ma'lumotlarni tozalash
     context.user_data.pop('pending_channel', None)
 
+@Metrics.timed("show_channel_details")
 async def show_channel_details(query, channel_id: str):
     """Kanal tafsilotlarini ko'rsatish"""
-    channel_data = ChannelManager.load_channel_data(channel_id)
+    channel_data = await ChannelManager.load_channel_data_async(channel_id)
     
     if not channel_data:
         await query.edit_message_text(
@@ -362,30 +642,30 @@ async def show_channel_details(query, channel_id: str):
         return
     
     # Statistikani hisoblash
-    pending_users = UserManager.get_join_requests(channel_id)
-    daily_requests = UserManager.get_join_requests(channel_id, ONE_DAY)
-    monthly_requests = UserManager.get_join_requests(channel_id, ONE_MONTH)
+    pending_count = UserManager.count_join_requests(channel_id)
+    daily_count = UserManager.count_join_requests(channel_id, ONE_DAY)
+    monthly_count = UserManager.count_join_requests(channel_id, ONE_MONTH)
+    histogram = UserManager.get_join_histogram(channel_id)
     
-    # Bot adminligini tekshirish (real vaqtda)
+    # Bot adminligini tekshirish (kesh orqali)
     try:
-        bot_member = await query.bot.get_chat_member(
-            chat_id=int(channel_id),
-            user_id=query.bot.id
-        )
-        is_admin = bot_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+        is_admin = await BotAdminCache.is_admin(query.get_bot(), channel_id)
     except:
         is_admin = False
     
+    channel_title = channel_data.get('title', "Noma'lum")
     text = (
         f"📊 Kanal statistikasi:\n\n"
-        f"📛 Nomi: {channel_data.get('title', 'Noma\'lum')}\n"
+        f"📛 Nomi: {channel_title}\n"
         f"🔗 Username: @{channel_data.get('username', 'Yoq')}\n"
         f"🆔 ID: {channel_data['id']}\n"
         f"🤖 Bot admini: {'✅ Ha' if is_admin else '❌ Yoq'}\n\n"
         f"📈 Statistika:\n"
-        f"• Kutilayotgan so'rovlar: {len(pending_users)} ta\n"
-        f"• Oxirgi 24 soat: {len(daily_requests)} ta\n"
-        f"• Oxirgi 30 kun: {len(monthly_requests)} ta\n\n"
+        f"• Kutilayotgan so'rovlar: {pending_count} ta\n"
+        f"• Oxirgi 24 soat: {daily_count} ta\n"
+        f"• Oxirgi 30 kun: {monthly_count} ta\n"
+        f"• Soatlik oqim (24 soat): {format_histogram(histogram[-24:])}\n"
+        f"• Eng faol soat (30 kun): {max(histogram)} ta so'rov\n\n"
         f"⬇️ Amallarni tanlang:"
     )
     
@@ -394,6 +674,7 @@ async def show_channel_details(query, channel_id: str):
         reply_markup=get_channel_keyboard(channel_id)
     )
 
+@Metrics.timed("accept_all_requests")
 async def accept_all_requests(query, channel_id: str, context: ContextTypes.DEFAULT_TYPE):
     """Barcha so'rovlarni qabul qilish"""
     pending_users = UserManager.get_join_requests(channel_id)
@@ -407,11 +688,7 @@ async def accept_all_requests(query, channel_id: str, context: ContextTypes.DEFA
     
     # Bot adminligini tekshirish
     try:
-        bot_member = await query.bot.get_chat_member(
-            chat_id=int(channel_id),
-            user_id=query.bot.id
-        )
-        if bot_member.status not in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
+        if not await BotAdminCache.is_admin(query.get_bot(), channel_id):
             await query.edit_message_text(
                 "❌ Bot kanalda admin emas!",
                 reply_markup=get_admin_main_keyboard()
@@ -425,33 +702,211 @@ async def accept_all_requests(query, channel_id: str, context: ContextTypes.DEFA
         )
         return
     
-    # Foydalanuvchilarni qo'shish
-    successful = 0
-    failed = 0
+    # Foydalanuvchilarni qo'shish fonda bajariladi,
+    # jarayon va natija shu xabarda ko'rsatiladi
+    job_manager: JobManager = context.bot_data['job_manager']
+    job = await job_manager.submit(
+        channel_id, pending_users, query.message.chat_id, query.message.message_id
+    )
+    if job is None:
+        await query.edit_message_text(JOB_BUSY_TEXT, reply_markup=get_channel_keyboard(channel_id))
+
+@Metrics.timed("show_pending_users")
+async def show_pending_users(query, channel_id: str, cursor: Optional[Tuple[int, int]] = None,
+                             backward: bool = False):
+    """Kanalning kutilayotgan foydalanuvchilarini sahifalab ko'rsatish"""
+    rows, generation, has_prev, has_next = UserManager.get_join_requests_page(
+        channel_id, cursor, backward, PENDING_PAGE_SIZE
+    )
     
-    await query.edit_message_text(f"⏳ Foydalanuvchilar qo'shilmoqda...")
+    lines = [
+        f"• <a href=\"tg://user?id={user_id}\">{user_id}</a> - "
+        f"{datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')}"
+        for _, user_id, ts in rows
+    ]
     
-    for user_id in pending_users:
-        try:
-            await context.bot.approve_chat_join_request(
-                chat_id=int(channel_id),
-                user_id=user_id
+    # Kursor - (generation, sahifaning chetki qatori)
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Oldingi", callback_data=f"pending_prev_{channel_id}_{generation}_{rows[0][0]}"
+        ))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            "Keyingi ➡️", callback_data=f"pending_next_{channel_id}_{generation}_{rows[-1][0]}"
+        ))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("⬅️ Orqaga", callback_data=f"channel_{channel_id}")])
+    
+    await query.edit_message_text(
+        f"👥 Kutilayotgan so'rovlar: {UserManager.count_join_requests(channel_id)} ta\n\n"
+        + ("\n".join(lines) or "📭 Kutilayotgan so'rovlar yo'q!"),
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@Metrics.timed("show_decline_options")
+async def show_decline_options(query, channel_id: str):
+    """Eski so'rovlarni rad etish uchun muddatni tanlash"""
+    keyboard = []
+    for days in DECLINE_AGE_PRESETS:
+        count = len(UserManager.get_stale_join_requests(channel_id, timedelta(days=days)))
+        keyboard.append([InlineKeyboardButton(
+            f"{days} kundan eski ({count} ta)",
+            callback_data=f"decline_{days}_{channel_id}"
+        )])
+    keyboard.append([InlineKeyboardButton("⬅️ Orqaga", callback_data=f"channel_{channel_id}")])
+    
+    await query.edit_message_text(
+        f"🗑 Eski so'rovlarni rad etish\n\n"
+        f"📥 Kutilayotgan so'rovlar: {UserManager.count_join_requests(channel_id)} ta\n\n"
+        f"ℹ️ Tanlangan muddatdan oldin kelgan so'rovlar rad etiladi.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@Metrics.timed("decline_stale_requests")
+async def decline_stale_requests(query, channel_id: str, days: int,
+                                 context: ContextTypes.DEFAULT_TYPE):
+    """days kundan oldin kelgan kutilayotgan so'rovlarni rad etish"""
+    stale_users = UserManager.get_stale_join_requests(channel_id, timedelta(days=days))
+    
+    if not stale_users:
+        await query.edit_message_text(
+            f"📭 {days} kundan eski so'rovlar yo'q!",
+            reply_markup=get_channel_keyboard(channel_id)
+        )
+        return
+    
+    try:
+        if not await BotAdminCache.is_admin(query.get_bot(), channel_id):
+            await query.edit_message_text(
+                "❌ Bot kanalda admin emas!",
+                reply_markup=get_admin_main_keyboard()
             )
-            successful += 1
-        except Exception as e:
-            logger.error(f"Foydalanuvchini qo'shishda xato {user_id}: {e}")
-            failed += 1
+            return
+    except Exception as e:
+        logger.error(f"Adminlik tekshirishda xato: {e}")
+        await query.edit_message_text(
+            "❌ Kanalga kirishda xatolik!",
+            reply_markup=get_admin_main_keyboard()
+        )
+        return
+    
+    # Qabul qilish vazifalari kabi fonda, umumiy tezlik cheklovi bilan
+    job_manager: JobManager = context.bot_data['job_manager']
+    job = await job_manager.submit(
+        channel_id, stale_users, query.message.chat_id, query.message.message_id, action=DECLINE
+    )
+    if job is None:
+        await query.edit_message_text(JOB_BUSY_TEXT, reply_markup=get_channel_keyboard(channel_id))
+
+@Metrics.timed("cancel_job")
+async def cancel_job(query, job_id: str, context: ContextTypes.DEFAULT_TYPE):
+    """Fondagi qabul qilish vazifasini to'xtatish"""
+    job_manager: JobManager = context.bot_data['job_manager']
+    
+    if not job_manager.cancel(job_id):
+        await query.edit_message_text(
+            "❌ Vazifa topilmadi yoki allaqachon tugagan.",
+            reply_markup=get_admin_main_keyboard()
+        )
+        return
+    
+    # Yakuniy natija joriy paket tugagach shu xabarda chiqadi
+    await query.edit_message_text("⛔ To'xtatilmoqda...")
+
+@Metrics.timed("show_auto_approve_settings")
+async def show_auto_approve_settings(query, channel_id: str):
+    """Kanal uchun avtomatik qabul sozlamalarini ko'rsatish"""
+    channel_data = await ChannelManager.load_channel_data_async(channel_id)
+    
+    if not channel_data:
+        await query.edit_message_text(
+            "❌ Kanal topilmadi!",
+            reply_markup=get_admin_main_keyboard()
+        )
+        return
+    
+    policy = get_auto_approve_policy(channel_data)
+    channel_title = channel_data.get('title', "Noma'lum")
+    status_text = "✅ Yoqilgan" if policy['enabled'] else "⏸ O'chirilgan"
     
-    # Natijani chiqarish
     await query.edit_message_text(
-        f"✅ So'rovlar qabul qilindi!\n\n"
-        f"✅ Muvaffaqiyatli: {successful} ta\n"
-        f"❌ Muvaffaqiyatsiz: {failed} ta\n"
-        f"📊 Jami: {len(pending_users)} ta",
-        reply_markup=get_admin_main_keyboard()
+        f"⏱ Avtomatik qabul sozlamalari:\n\n"
+        f"📛 Kanal: {channel_title}\n"
+        f"🔘 Holat: {status_text}\n"
+        f"⚡ Tezlik: {format_auto_rate(policy)}\n"
+        f"🌙 Sokin soatlar: {format_quiet_hours(policy)}\n"
+        f"📥 Kutilayotgan so'rovlar: {UserManager.count_join_requests(channel_id)} ta\n\n"
+        f"ℹ️ Yoqilganda kutilayotgan so'rovlar shu tezlikda bir tekis qabul qilinadi.",
+        reply_markup=get_auto_approve_keyboard(channel_id, policy)
     )
 
-async def request_accept_count(query, channel_id: str):
+@Metrics.timed("update_auto_approve")
+async def update_auto_approve(query, channel_id: str, action: str):
+    """Avtomatik qabul siyosatining bitta sozlamasini o'zgartirish"""
+    channel_data = await ChannelManager.load_channel_data_async(channel_id)
+    
+    if not channel_data:
+        await query.edit_message_text(
+            "❌ Kanal topilmadi!",
+            reply_markup=get_admin_main_keyboard()
+        )
+        return
+    
+    policy = get_auto_approve_policy(channel_data)
+    
+    if action == "toggle":
+        policy['enabled'] = not policy['enabled']
+    elif action == "rate":
+        current = (policy['rate'], policy['per'])
+        index = AUTO_RATE_PRESETS.index(current) if current in AUTO_RATE_PRESETS else -1
+        policy['rate'], policy['per'] = AUTO_RATE_PRESETS[(index + 1) % len(AUTO_RATE_PRESETS)]
+    elif action == "order":
+        policy['order'] = "random" if policy['order'] == "fifo" else "fifo"
+    elif action == "quiet":
+        current = policy['quiet_hours']
+        index = QUIET_HOURS_PRESETS.index(current) if current in QUIET_HOURS_PRESETS else -1
+        policy['quiet_hours'] = QUIET_HOURS_PRESETS[(index + 1) % len(QUIET_HOURS_PRESETS)]
+    
+    channel_data['auto_approve'] = policy
+    await ChannelManager.save_channel_data_async(channel_id, channel_data)
+    
+    await show_auto_approve_settings(query, channel_id)
+
+@Metrics.timed("export_requests")
+async def export_requests(query, channel_id: str, fmt: str):
+    """Kanal so'rovlarini gzip CSV/JSONL fayl qilib yuborish"""
+    await query.edit_message_text("⏳ Eksport tayyorlanmoqda...")
+    
+    file_path = None
+    try:
+        # Bitta kanal eksporti bir vaqtda bir marta
+        file_path, rows = await run_io(
+            export_channel_requests, channel_id, fmt, lock_key=f"export:{channel_id}"
+        )
+        with open(file_path, 'rb') as f:
+            await query.message.reply_document(
+                document=f,
+                filename=file_path.name,
+                caption=f"📤 Kanal {channel_id}: {rows} ta so'rov (user_id, requested_at, status)"
+            )
+        await query.edit_message_text(
+            f"✅ Eksport yuborildi: {rows} ta so'rov.",
+            reply_markup=get_channel_keyboard(channel_id)
+        )
+    except Exception as e:
+        logger.error(f"Kanal {channel_id} eksportida xato: {e}")
+        await query.edit_message_text(
+            "❌ Eksportda xatolik!",
+            reply_markup=get_channel_keyboard(channel_id)
+        )
+    finally:
+        if file_path is not None and file_path.exists():
+            file_path.unlink()
+
+@Metrics.timed("request_accept_count")
+async def request_accept_count(query, channel_id: str, context: ContextTypes.DEFAULT_TYPE):
     """Qabul qilish sonini so'rash"""
     await query.edit_message_text(
         "🔢 Qancha foydalanuvchini qabul qilmoqchisiz?\n"
@@ -460,14 +915,9 @@ async def request_accept_count(query, channel_id: str):
     )
     
     # Contextga kanal ID ni saqlash
-    query.message.chat.id = query.message.chat.id
-    query.message.message_id = query.message.message_id
-    
-    from telegram.ext import ConversationHandler
-    context = query.message._context
-    
     context.user_data['accept_count_channel'] = channel_id
 
+@Metrics.timed("process_accept_count")
 async def process_accept_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Sonni qayta ishlash va foydalanuvchilarni qabul qilish"""
     user_id = update.effective_user.id
@@ -494,11 +944,7 @@ async def process_accept_count(update: Update, context: ContextTypes.DEFAULT_TYP
         
         # Bot adminligini tekshirish
         try:
-            bot_member = await context.bot.get_chat_member(
-                chat_id=int(channel_id),
-                user_id=context.bot.id
-            )
-            if bot_member.status not in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
+            if not await BotAdminCache.is_admin(context.bot, channel_id):
                 await update.message.reply_text(
                     "❌ Bot kanalda admin emas!",
                     reply_markup=get_admin_main_keyboard()
@@ -526,31 +972,17 @@ async def process_accept_count(update: Update, context: ContextTypes.DEFAULT_TYP
         count = min(count, len(pending_users))
         selected_users = random.sample(pending_users, count)
         
-        # Foydalanuvchilarni qo'shish
-        successful = 0
-        failed = 0
-        
+        # Foydalanuvchilarni qo'shish (fonda, natija shu xabarda ko'rsatiladi)
         processing_msg = await update.message.reply_text(f"⏳ {count} ta foydalanuvchi qo'shilmoqda...")
         
-        for user_id in selected_users:
-            try:
-                await context.bot.approve_chat_join_request(
-                    chat_id=int(channel_id),
-                    user_id=user_id
-                )
-                successful += 1
-            except Exception as e:
-                logger.error(f"Foydalanuvchini qo'shishda xato {user_id}: {e}")
-                failed += 1
-        
-        # Natijani chiqarish
-        await processing_msg.edit_text(
-            f"✅ {count} ta foydalanuvchidan {successful} tasi qabul qilindi!\n\n"
-            f"✅ Muvaffaqiyatli: {successful} ta\n"
-            f"❌ Muvaffaqiyatsiz: {failed} ta\n"
-            f"📊 Jami so'rov: {len(pending_users)} ta",
-            reply_markup=get_admin_main_keyboard()
+        job_manager: JobManager = context.bot_data['job_manager']
+        job = await job_manager.submit(
+            channel_id, selected_users, processing_msg.chat_id, processing_msg.message_id
         )
+        if job is None:
+            await processing_msg.edit_text(
+                JOB_BUSY_TEXT, reply_markup=get_channel_keyboard(channel_id)
+            )
         
         # Contextni tozalash
         context.user_data.pop('accept_count_channel', None)
@@ -561,6 +993,7 @@ async def process_accept_count(update: Update, context: ContextTypes.DEFAULT_TYP
             reply_markup=get_cancel_keyboard()
         )
 
+@Metrics.timed("handle_chat_join_request")
 async def handle_chat_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Chat join request ni qayd qilish"""
     chat_join_request = update.chat_join_request
@@ -569,27 +1002,24 @@ async def handle_chat_join_request(update: Update, context: ContextTypes.DEFAULT
     chat_id = str(chat_join_request.chat.id)
     
     # So'rovni ma'lumotlar bazasiga qo'shish
-    UserManager.add_join_request(user_id, chat_id)
+    await UserManager.add_join_request_async(user_id, chat_id)
+    Metrics.mark("join_requests")
     
-    # Kanal ma'lumotlarini yangilash (agar yo'q bo'lsa)
-    channel_data = ChannelManager.load_channel_data(chat_id)
-    if not channel_data:
+    # Kanal ma'lumotlarini yangilash (agar yo'q bo'lsa), tekshiruv xotiradan
+    if not ChannelManager.channel_exists(chat_id):
         try:
             chat = await context.bot.get_chat(int(chat_id))
-            bot_member = await context.bot.get_chat_member(
-                chat_id=int(chat_id),
-                user_id=context.bot.id
-            )
+            is_admin = await BotAdminCache.is_admin(context.bot, chat_id)
             
             save_data = {
                 'id': chat_id,
                 'title': chat.title,
                 'username': chat.username,
                 'added_date': datetime.now().isoformat(),
-                'is_bot_admin': bot_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+                'is_bot_admin': is_admin
             }
             
-            ChannelManager.save_channel_data(chat_id, save_data)
+            await ChannelManager.save_channel_data_async(chat_id, save_data)
             
             # Adminlarga bildirishnoma
             for admin_id in ADMIN_IDS:
@@ -608,13 +1038,118 @@ async def handle_chat_join_request(update: Update, context: ContextTypes.DEFAULT
         except Exception as e:
             logger.error(f"Kanal ma'lumotlarini saqlashda xato: {e}")
 
-def main():
-    """Asosiy dastur"""
-    # Application yaratish
-    application = Application.builder().token(BOT_TOKEN).build()
+async def start_background_services(application: Application):
+    """Yetakchi qulfini olgach tugallanmagan vazifalar, avtomatik qabul va tozalashni boshlash
+
+    Bir nechta worker bo'lsa ular faqat bittasida ishlaydi (aks holda vazifalar
+    N marta tiklanadi va avtomatik qabul tezligi N barobar oshadi); qolganlari
+    yetakchi to'xtasa o'rnini olish uchun vaqti-vaqti bilan qayta urinadi.
+    """
+    leader: LeaderLock = application.bot_data['leader_lock']
+    while not leader.acquire():
+        await asyncio.sleep(LEADER_RETRY_INTERVAL)
+    logger.info("Fon xizmatlari shu worker da ishga tushdi")
+    application.bot_data['job_manager'].resume_all()
+    application.bot_data['auto_approver'].start()
+    application.bot_data['retention'].start()
+
+async def post_init(application: Application):
+    """Ishga tushganda fon xizmatlari va metrikalarni ishga tushirish"""
+    application.bot_data['leader_task'] = asyncio.get_running_loop().create_task(
+        start_background_services(application)
+    )
+    application.bot_data['metrics_server'].start()
+
+async def post_shutdown(application: Application):
+    """To'xtashda vazifalarni to'xtatib, buferdagi yozuvlarni diskka yozish"""
+    leader_task = application.bot_data.get('leader_task')
+    if leader_task is not None:
+        leader_task.cancel()
+        await asyncio.gather(leader_task, return_exceptions=True)
+    application.bot_data['metrics_server'].stop()
+    await application.bot_data['retention'].stop()
+    await application.bot_data['auto_approver'].stop()
+    await application.bot_data['job_manager'].stop()
+    application.bot_data['leader_lock'].release()
+    close_storage()
+
+@Metrics.timed("handle_my_chat_member")
+async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Botning kanaldagi huquqlari o'zgarganda adminlik keshini yangilash"""
+    my_chat_member = update.my_chat_member
+    chat_id = str(my_chat_member.chat.id)
+    is_admin = my_chat_member.new_chat_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+    
+    BotAdminCache.set(chat_id, is_admin)
+    
+    channel_data = ChannelManager.load_channel_data(chat_id)
+    if channel_data and channel_data.get('is_bot_admin') != is_admin:
+        channel_data['is_bot_admin'] = is_admin
+        await ChannelManager.save_channel_data_async(chat_id, channel_data)
+    
+    logger.info(f"Bot huquqlari o'zgardi: kanal {chat_id}, admin: {is_admin}")
+
+@Metrics.timed("handle_chat_member")
+async def handle_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Kutilayotgan foydalanuvchi kanalga qo'shilsa yoki chiqib ketsa so'rovini yopish
+
+    Boshqa admin Telegram ilovasida qabul qilgan foydalanuvchilar keyingi
+    qabul qilish vazifalariga tushmaydi.
+    """
+    chat_member = update.chat_member
+    chat_id = str(chat_member.chat.id)
+    user_id = chat_member.new_chat_member.user.id
+    
+    # Oddiy a'zolik o'zgarishlari (so'rovsiz) saqlashga tegmaydi
+    if not UserManager.is_pending(chat_id, user_id):
+        return
+    
+    new_status = chat_member.new_chat_member.status
+    if new_status in JOINED_MEMBER_STATUSES:
+        status = "approved"
+    elif new_status in LEFT_MEMBER_STATUSES:
+        status = "dropped"
+    else:
+        return
+    
+    await UserManager.set_statuses_async(chat_id, {user_id: status})
+    Metrics.inc("reconciled_requests_total", status=status)
+
+def build_application() -> Application:
+    """Handlerlar va fon xizmatlari ulangan Application (yuklama sinovi ham shundan foydalanadi)"""
+    application = (
+        Application.builder()
+        .application_class(OrderedApplication)
+        .concurrent_updates(UPDATE_BACKLOG)
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_URL)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    
+    # Join so'rovlarni qabul qilish (barcha handlerlar uchun umumiy tezlik cheklovi)
+    application.bot_data['approval_engine'] = ApprovalEngine(application.bot)
+    application.bot_data['job_manager'] = JobManager(
+        application.bot,
+        application.bot_data['approval_engine'],
+        final_markup=get_admin_main_keyboard
+    )
+    application.bot_data['auto_approver'] = AutoApproveScheduler(
+        application.bot_data['approval_engine'],
+        is_admin=lambda channel_id: BotAdminCache.is_admin(application.bot, channel_id),
+        job_manager=application.bot_data['job_manager']
+    )
+    application.bot_data['retention'] = RetentionScheduler()
+    application.bot_data['leader_lock'] = LeaderLock()
+    application.bot_data['metrics_server'] = MetricsServer(METRICS_LISTEN, METRICS_PORT)
     
     # Handlerlar
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("compact", compact_command))
+    application.add_handler(CommandHandler("stats", stats_command))
     
     # Callback handler
     application.add_handler(CallbackQueryHandler(button_callback))
@@ -632,14 +1167,50 @@ def main():
     ))
     
     # Chat join request handler
-    application.add_handler(MessageHandler(
-        filters.StatusUpdate.CHAT_JOIN_REQUEST,
-        handle_chat_join_request
+    application.add_handler(ChatJoinRequestHandler(handle_chat_join_request))
+    
+    # Botning kanaldagi huquqlari o'zgarishi
+    application.add_handler(ChatMemberHandler(
+        handle_my_chat_member,
+        ChatMemberHandler.MY_CHAT_MEMBER
+    ))
+    
+    # Kanal a'zolari o'zgarishi (boshqa admin qabul qilgan so'rovlar)
+    application.add_handler(ChatMemberHandler(
+        handle_chat_member,
+        ChatMemberHandler.CHAT_MEMBER
     ))
     
+    return application
+
+def main():
+    """Asosiy dastur"""
+    application = build_application()
+    
+    # Saqlash qatlamini ochish (JSON jurnal xotiraga yuklanadi)
+    get_storage()
+    
     # Botni ishga tushirish
-    print("🤖 Bot ishga tushdi...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if RUN_MODE == "webhook":
+        if not WEBHOOK_URL or not WEBHOOK_SECRET:
+            raise ValueError("Webhook rejimi uchun WEBHOOK_URL va WEBHOOK_SECRET kerak")
+        
+        # Mahalliy sinov: yozib olingan update JSON ni POST qilish mumkin, masalan
+        # curl -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+        #      -H "Content-Type: application/json" -d @update.json \
+        #      http://127.0.0.1:8443/webhook
+        print(f"🤖 Bot webhook rejimida ishga tushdi ({WEBHOOK_LISTEN}:{WEBHOOK_PORT})...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_URL_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        print("🤖 Bot ishga tushdi...")
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
-    main()bot
+    main()
@@ -10,3 +10,48 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_IDS = [
     int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id
 ]
+
+# Saqlash turi: "json" (kichik o'rnatmalar uchun) yoki "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+
+# SQLite ma'lumotlar bazasi fayli
+SQLITE_FILE = os.getenv("SQLITE_FILE", "bot.db")
+
+# Bir nechta jarayon (worker) bitta JSON papkaga yozadimi: yoqilganda har bir
+# jarayon fon oqimida boshqalar yozgan jurnal qatorlarini kuzatadi.
+# Bitta jarayon uchun o'chiq qoldiring (kuzatish har kanal faylini tekshiradi)
+STORAGE_MULTIPROCESS = os.getenv("STORAGE_MULTIPROCESS", "0").lower() in ("1", "true", "yes")
+
+# Join so'rovlarni qabul qilish: parallel so'rovlar soni, soniyasiga so'rovlar
+# (Telegram bot uchun ~30 ta/s) va tarmoq xatolarida qayta urinishlar
+APPROVAL_CONCURRENCY = int(os.getenv("APPROVAL_CONCURRENCY", "8"))
+APPROVAL_RATE = float(os.getenv("APPROVAL_RATE", "25"))
+APPROVAL_MAX_RETRIES = int(os.getenv("APPROVAL_MAX_RETRIES", "3"))
+
+# Yangilanishlar parallel qayta ishlanadi: har xil kanal/admin lar uchun shuncha
+# tagacha bir vaqtda, bitta kanal yoki admin yangilanishlari esa navbat bilan
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))
+
+# Ishga tushirish usuli: "polling" yoki "webhook"
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+
+# Webhook sozlamalari (RUN_MODE=webhook bo'lganda)
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_URL_PATH = os.getenv("WEBHOOK_URL_PATH", "webhook")
+# Telegram yuboradigan tashqi manzil, masalan https://example.com/webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# X-Telegram-Bot-Api-Secret-Token sarlavhasi orqali tekshiriladi
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Qayta ishlangan (qabul qilingan/tashlab yuborilgan) so'rovlar shuncha kun saqlanadi
+HANDLED_RETENTION_DAYS = int(os.getenv("HANDLED_RETENTION_DAYS", "30"))
+# Tarixni tozalash (retention) shuncha soatda bir marta fonda ishlaydi, 0 - o'chirilgan
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+
+# Bot API manzili (yuklama sinovida mahalliy soxta server, masalan http://127.0.0.1:8081/bot)
+BOT_API_URL = os.getenv("BOT_API_URL", "https://api.telegram.org/bot")
+
+# Prometheus metrikalari (GET /metrics) shu manzil va portda, 0 - o'chirilgan
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
@@ -0,0 +1,67 @@
+import csv
+import gzip
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Tuple
+
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Eksport fayllari shu papkada tayyorlanadi va yuborilgach o'chiriladi
+EXPORTS_DIR = Path("exports")
+EXPORTS_DIR.mkdir(exist_ok=True)
+
+# Qo'llab-quvvatlanadigan formatlar: fayl kengaytmasi
+EXPORT_FORMATS = {
+    "csv": "csv.gz",
+    "jsonl": "jsonl.gz",
+}
+
+EXPORT_COLUMNS = ("user_id", "requested_at", "status")
+
+def export_channel_requests(channel_id: str, fmt: str) -> Tuple[Path, int]:
+    """Kanal so'rovlarini gzip CSV/JSONL faylga yozish: (fayl, qatorlar soni)
+
+    So'rovlar saqlash qatlamidan bo'laklab o'qiladi va darhol siqilgan faylga
+    yoziladi - xotira kanal hajmiga bog'liq emas. Har bir qator bitta so'rov
+    (kelish tartibida), foydalanuvchining birinchi va oxirgi so'rovi uning
+    ID si bilan kelgan birinchi va oxirgi qatorlar.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Noma'lum eksport formati: {fmt}")
+
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    file_path = EXPORTS_DIR / f"requests-{channel_id}-{stamp}.{EXPORT_FORMATS[fmt]}"
+    started = time.perf_counter()
+    rows = 0
+    try:
+        with gzip.open(file_path, 'wt', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f) if fmt == "csv" else None
+            if writer is not None:
+                writer.writerow(EXPORT_COLUMNS)
+            for chunk in get_storage().iter_channel_requests(channel_id):
+                records = [
+                    (user_id, datetime.fromtimestamp(ts).isoformat(), status)
+                    for user_id, ts, status in chunk
+                ]
+                if writer is not None:
+                    writer.writerows(records)
+                else:
+                    f.write("".join(
+                        json.dumps(dict(zip(EXPORT_COLUMNS, record))) + "\n" for record in records
+                    ))
+                rows += len(records)
+    except Exception:
+        if file_path.exists():
+            file_path.unlink()
+        raise
+
+    logger.info(
+        f"Kanal {channel_id} eksporti: {rows} ta so'rov, {file_path.stat().st_size} bayt, "
+        f"{time.perf_counter() - started:.2f} s"
+    )
+    return file_path, rows
@@ -0,0 +1,419 @@
+"""Yuklama sinovi uchun mahalliy soxta Telegram Bot API serveri
+
+Bot ishlatadigan metodlar (getUpdates/webhook, getChat, getChatMember,
+approveChatJoinRequest, sendMessage, sendDocument va h.k.) sozlanadigan kechikish, xato
+ulushi va 429 (retry_after) javoblari bilan xizmat qiladi. Yangilanishlar
+enqueue() orqali navbatga qo'yiladi va getUpdates yoki webhook orqali
+yetkaziladi; har bir yangilanish yaratilgan vaqti saqlanadi.
+
+Alohida ishga tushirish:
+    python fake_telegram.py --port 8081 --latency-ms 30 --error-rate 0.01
+    BOT_API_URL=http://127.0.0.1:8081/bot python bot.py
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# Soxta botning o'zi
+BOT_USER = {
+    "id": 1000,
+    "is_bot": True,
+    "first_name": "Accepter",
+    "username": "accepter_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+# getUpdates bitta javobda shuncha yangilanish qaytaradi
+MAX_UPDATES = 100
+
+# Webhook orqali parallel yetkazish oqimlari (Telegram max_connections ga o'xshash)
+WEBHOOK_SENDERS = 8
+
+# So'rovni qabul qilish mumkin bo'lmagan holat (bot tomonida "dropped" deb olinadi)
+APPROVE_ERROR = "Bad Request: HIDE_REQUESTER_MISSING"
+
+class FakeApiConfig:
+    """Javoblar sozlamalari
+
+    latency_ms/jitter_ms - har bir metod javobidan oldingi kechikish va uning
+    tasodifiy qo'shimchasi; error_rate - approve/declineChatJoinRequest uchun
+    400 xato ulushi; retry_after_rate/retry_after - 429 javoblari ulushi va
+    kutish vaqti; flood_limit - soniyasiga shundan ko'p qabul qilishda 429
+    (0 - cheklovsiz).
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, retry_after_rate: float = 0.0,
+                 retry_after: int = 1, flood_limit: float = 0.0, seed: int = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.flood_limit = flood_limit
+        self.seed = seed
+
+class UploadedFile:
+    """multipart/form-data orqali yuborilgan fayl (faqat nomi va hajmi saqlanadi)"""
+
+    def __init__(self, filename: str, size: int):
+        self.filename = filename
+        self.size = size
+
+class ApiError(Exception):
+    def __init__(self, code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+class FakeTelegramState:
+    """Server holati: yangilanishlar navbati, chaqiruvlar va qabul qilishlar hisobi"""
+
+    def __init__(self, config: FakeApiConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.cond = threading.Condition()
+        self.updates: deque = deque()
+        self.next_update_id = 1
+        self.created: Dict[int, float] = {}
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.next_message_id = 1
+        self.calls: Counter = Counter()
+        self.approved: Dict[int, set] = {}
+        self.approve_times: List[float] = []
+        self.injected: Counter = Counter()
+        self.uploads = 0
+        self.upload_bytes = 0
+        self._flood_window: deque = deque()
+
+    # --- Yangilanishlar ---
+
+    def enqueue(self, update: dict) -> int:
+        """Yangilanishni navbatga qo'yish, update_id ni qaytaradi"""
+        with self.cond:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.created[update_id] = time.monotonic()
+            self.updates.append({"update_id": update_id, **update})
+            self.cond.notify_all()
+        return update_id
+
+    def get_updates(self, offset: int, limit: int, timeout: float) -> List[dict]:
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                # offset dan kichiklari bot tomonidan qabul qilingan
+                while self.updates and self.updates[0]["update_id"] < offset:
+                    self.updates.popleft()
+                if self.updates or self.webhook_url:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            if self.webhook_url:
+                raise ApiError(409, "Conflict: can't use getUpdates method while webhook is active")
+            return [self.updates[index] for index in range(min(limit, len(self.updates)))]
+
+    def next_webhook_update(self, timeout: float = 0.5) -> Optional[dict]:
+        with self.cond:
+            if not (self.updates and self.webhook_url):
+                self.cond.wait(timeout)
+            if self.updates and self.webhook_url:
+                return self.updates.popleft()
+            return None
+
+    # --- Chaqiruvlar ---
+
+    def _delay(self):
+        delay = self.config.latency_ms + self.random.random() * self.config.jitter_ms
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _message(self, chat_id, text: Optional[str] = None, message_id: Optional[int] = None) -> dict:
+        with self.cond:
+            if message_id is None:
+                message_id = self.next_message_id
+                self.next_message_id += 1
+        return {
+            "message_id": int(message_id),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private", "first_name": "Admin"},
+            "from": BOT_USER,
+            "text": text or "",
+        }
+
+    def _check_approve_errors(self):
+        config = self.config
+        with self.cond:
+            if config.flood_limit:
+                now = time.monotonic()
+                while self._flood_window and now - self._flood_window[0] > 1:
+                    self._flood_window.popleft()
+                if len(self._flood_window) >= config.flood_limit:
+                    self.injected["flood_limit"] += 1
+                    raise ApiError(429, f"Too Many Requests: retry after {config.retry_after}",
+                                   config.retry_after)
+                self._flood_window.append(now)
+            roll = self.random.random()
+            if roll < config.retry_after_rate:
+                self.injected["retry_after"] += 1
+                raise ApiError(429, f"Too Many Requests: retry after {config.retry_after}",
+                               config.retry_after)
+            if roll < config.retry_after_rate + config.error_rate:
+                self.injected["bad_request"] += 1
+                raise ApiError(400, APPROVE_ERROR)
+
+    def call(self, method: str, params: dict):
+        """Bot API metodini bajarish: natija yoki ApiError"""
+        files = [value for value in params.values() if isinstance(value, UploadedFile)]
+        with self.cond:
+            self.calls[method] += 1
+            self.uploads += len(files)
+            self.upload_bytes += sum(upload.size for upload in files)
+        if method != "getUpdates":
+            self._delay()
+
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return self.get_updates(
+                int(params.get("offset") or 0),
+                min(MAX_UPDATES, int(params.get("limit") or MAX_UPDATES)),
+                float(params.get("timeout") or 0)
+            )
+        if method == "setWebhook":
+            with self.cond:
+                self.webhook_url = params.get("url") or None
+                self.webhook_secret = params.get("secret_token")
+                self.cond.notify_all()
+            return True
+        if method == "deleteWebhook":
+            with self.cond:
+                self.webhook_url = None
+                if params.get("drop_pending_updates"):
+                    self.updates.clear()
+            return True
+        if method == "getChat":
+            chat_id = int(params["chat_id"])
+            return {"id": chat_id, "type": "channel", "title": f"Kanal {chat_id}"}
+        if method == "getChatMember":
+            user_id = int(params["user_id"])
+            if user_id == BOT_USER["id"]:
+                return {
+                    "status": "administrator",
+                    "user": BOT_USER,
+                    "can_be_edited": False,
+                    "is_anonymous": False,
+                    "can_manage_chat": True,
+                    "can_delete_messages": True,
+                    "can_manage_video_chats": True,
+                    "can_restrict_members": True,
+                    "can_promote_members": False,
+                    "can_change_info": True,
+                    "can_invite_users": True,
+                }
+            return {"status": "member", "user": {"id": user_id, "is_bot": False, "first_name": "User"}}
+        if method in ("approveChatJoinRequest", "declineChatJoinRequest"):
+            self._check_approve_errors()
+            if method == "approveChatJoinRequest":
+                with self.cond:
+                    self.approved.setdefault(int(params["chat_id"]), set()).add(int(params["user_id"]))
+                    self.approve_times.append(time.monotonic())
+            return True
+        if method == "sendMessage":
+            return self._message(params["chat_id"], params.get("text"))
+        if method == "editMessageText":
+            return self._message(params["chat_id"], params.get("text"), params.get("message_id"))
+        if method == "sendDocument":
+            message = self._message(params["chat_id"])
+            del message["text"]
+            document = params.get("document")
+            if isinstance(document, UploadedFile):
+                message["document"] = {
+                    "file_id": f"doc-{message['message_id']}",
+                    "file_unique_id": f"doc-{message['message_id']}",
+                    "file_name": document.filename,
+                    "file_size": document.size,
+                }
+            if params.get("caption"):
+                message["caption"] = params["caption"]
+            return message
+        # answerCallbackQuery, editMessageReplyMarkup, sendChatAction va boshqalar
+        return True
+
+    def approvals_count(self) -> int:
+        with self.cond:
+            return len(self.approve_times)
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """POST/GET /bot<token>/<method>"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _params(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if not body:
+            return {}
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        if content_type.startswith("multipart/form-data"):
+            return self._multipart_params(content_type, body)
+
+        return {key: self._value(value) for key, value in parse_qsl(body.decode("utf-8"))}
+
+    @staticmethod
+    def _value(value: str):
+        # python-telegram-bot murakkab qiymatlarni JSON satr sifatida yuboradi
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+
+    def _multipart_params(self, content_type: str, body: bytes) -> dict:
+        """sendDocument va boshqa fayl yuklashlar: fayllar UploadedFile bo'ladi"""
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename() is not None:
+                params[name] = UploadedFile(part.get_filename(), len(payload))
+            else:
+                params[name] = self._value(payload.decode("utf-8"))
+        return params
+
+    def _respond(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            result = self.server.state.call(method, self._params())
+            self._respond(200, {"ok": True, "result": result})
+        except ApiError as e:
+            payload = {"ok": False, "error_code": e.code, "description": e.description}
+            if e.retry_after is not None:
+                payload["parameters"] = {"retry_after": e.retry_after}
+            self._respond(e.code, payload)
+
+    do_GET = do_POST
+
+class FakeTelegramServer:
+    """Soxta serverni fon oqimida ishga tushirish"""
+
+    def __init__(self, config: Optional[FakeApiConfig] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.state = FakeTelegramState(config or FakeApiConfig())
+        self.httpd = ThreadingHTTPServer((host, port), FakeTelegramHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._running = True
+        self._threads.append(threading.Thread(
+            target=self.httpd.serve_forever, name="fake-telegram", daemon=True
+        ))
+        for index in range(WEBHOOK_SENDERS):
+            self._threads.append(threading.Thread(
+                target=self._deliver_webhooks, name=f"fake-telegram-webhook-{index}", daemon=True
+            ))
+        for thread in self._threads:
+            thread.start()
+
+    def _deliver_webhooks(self):
+        state = self.state
+        while self._running:
+            update = state.next_webhook_update()
+            if update is None:
+                continue
+            request = urllib.request.Request(
+                state.webhook_url,
+                data=json.dumps(update).encode("utf-8"),
+                headers={
+                    "Content-Type": "application/json",
+                    "X-Telegram-Bot-Api-Secret-Token": state.webhook_secret or "",
+                },
+            )
+            # Telegram kabi: yetkazilmaguncha qayta urinish
+            while self._running:
+                try:
+                    urllib.request.urlopen(request, timeout=10).read()
+                    break
+                except Exception as e:
+                    logger.warning(f"Webhook yetkazilmadi ({update['update_id']}): {e}")
+                    time.sleep(0.2)
+
+    def stop(self):
+        self._running = False
+        with self.state.cond:
+            self.state.cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Soxta Telegram Bot API serveri")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--flood-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeTelegramServer(FakeApiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        flood_limit=args.flood_limit,
+    ), args.host, args.port)
+    server.start()
+    print(f"Soxta Bot API: {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
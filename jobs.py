@@ -0,0 +1,533 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from approvals import APPROVE, DECLINE, ApprovalEngine
+from config import HANDLED_RETENTION_DAYS, RETENTION_INTERVAL_HOURS
+from storage import ChannelManager, UserManager, atomic_write_json, locked_file, run_io
+
+logger = logging.getLogger(__name__)
+
+# Vazifalar holati saqlanadigan papka: <id>.json (holat) va <id>.users.json (ro'yxat)
+JOBS_DIR = Path("jobs")
+JOBS_DIR.mkdir(exist_ok=True)
+
+# Bir nechta worker da fon xizmatlarini (vazifalarni tiklash, avtomatik qabul,
+# tarixni tozalash) faqat shu qulfni olgan bittasi bajaradi
+LEADER_LOCK_FILE = JOBS_DIR / "leader.lock"
+
+# Qulfni ololmagan worker shuncha soniyada qayta urinadi (yetakchi to'xtasa o'rnini oladi)
+LEADER_RETRY_INTERVAL = 30
+
+# Har shuncha foydalanuvchidan keyin holat diskka yoziladi (checkpoint)
+JOB_CHUNK_SIZE = 100
+
+# Jarayon xabari shuncha soniyada bir martadan ko'p tahrirlanmaydi
+PROGRESS_INTERVAL = 3
+
+# Avtomatik qabul rejalashtiruvchisi shuncha soniyada bir marta ishlaydi
+AUTO_APPROVE_TICK = 10
+
+# Avtomatik qabulda xato bergan foydalanuvchi shuncha soniya o'tkazib yuboriladi
+# (navbat boshida qolib, har safar ruxsatni egallamasligi uchun)
+AUTO_APPROVE_RETRY_DELAY = 600
+
+# Kanal uchun avtomatik qabul siyosati (kanal ma'lumotlarida 'auto_approve')
+DEFAULT_AUTO_APPROVE = {
+    'enabled': False,
+    'rate': 20,
+    'per': "minute",        # "minute" yoki "hour"
+    'order': "fifo",        # "fifo" yoki "random"
+    'quiet_hours': None,    # [boshlanish, tugash] soatlari yoki None
+}
+
+# Vazifa holatlari
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+class ApprovalJob:
+    """Fonda bajariladigan qabul qilish (yoki rad etish - action) vazifasi"""
+
+    def __init__(self, job_id: str, channel_id: str, total: int, chat_id: int,
+                 message_id: int, position: int = 0, approved: int = 0, failed: int = 0,
+                 dropped: int = 0, elapsed: float = 0.0, status: str = RUNNING,
+                 action: str = APPROVE, declined: int = 0):
+        self.id = job_id
+        self.channel_id = channel_id
+        self.action = action
+        self.total = total
+        self.chat_id = chat_id
+        self.message_id = message_id
+        # user_ids ro'yxatida qayta ishlangan qism
+        self.position = position
+        self.approved = approved
+        self.declined = declined
+        self.failed = failed
+        self.dropped = dropped
+        self.elapsed = elapsed
+        self.status = status
+
+    @property
+    def state_file(self) -> Path:
+        return JOBS_DIR / f"{self.id}.json"
+
+    @property
+    def users_file(self) -> Path:
+        return JOBS_DIR / f"{self.id}.users.json"
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'channel_id': self.channel_id,
+            'total': self.total,
+            'chat_id': self.chat_id,
+            'message_id': self.message_id,
+            'position': self.position,
+            'approved': self.approved,
+            'declined': self.declined,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'elapsed': self.elapsed,
+            'status': self.status,
+            'action': self.action,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "ApprovalJob":
+        return ApprovalJob(
+            data['id'], data['channel_id'], data['total'], data['chat_id'],
+            data['message_id'], data['position'], data['approved'], data['failed'],
+            data['dropped'], data['elapsed'], data['status'],
+            # Eski vazifa fayllarida action yo'q - ular qabul qilish vazifalari
+            data.get('action', APPROVE), data.get('declined', 0)
+        )
+
+    def save(self):
+        atomic_write_json(self.state_file, self.to_dict())
+
+    def load_users(self) -> List[int]:
+        with open(self.users_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def remove(self):
+        self.state_file.unlink(missing_ok=True)
+        self.users_file.unlink(missing_ok=True)
+
+class LeaderLock:
+    """Jarayonlar orasida bitta yetakchi: LEADER_LOCK_FILE flock (kutmasdan)"""
+
+    def __init__(self, path: Path = LEADER_LOCK_FILE):
+        self.path = path
+        self._hold: Optional[ExitStack] = None
+
+    @property
+    def acquired(self) -> bool:
+        return self._hold is not None
+
+    def acquire(self) -> bool:
+        if self._hold is not None:
+            return True
+        hold = ExitStack()
+        if not hold.enter_context(locked_file(self.path, blocking=False)):
+            hold.close()
+            return False
+        self._hold = hold
+        return True
+
+    def release(self):
+        if self._hold is not None:
+            self._hold.close()
+            self._hold = None
+
+def get_job_keyboard(job_id: str):
+    keyboard = [
+        [InlineKeyboardButton("⛔ To'xtatish", callback_data=f"cancel_job_{job_id}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+class JobManager:
+    """Qabul qilish vazifalarini fonda bajarish, holatni saqlash va qayta tiklash
+
+    Kanal bir vaqtda bitta vazifa (yoki avtomatik qabul paketi) tomonidan band
+    qilinadi: jarayon ichida _claims, jarayonlar orasida jobs/channel-<id>.lock.
+    """
+
+    def __init__(self, bot: Bot, engine: ApprovalEngine,
+                 final_markup: Optional[Callable[[], InlineKeyboardMarkup]] = None):
+        self.bot = bot
+        self.engine = engine
+        self.final_markup = final_markup
+        self._jobs: Dict[str, ApprovalJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._claims: Dict[str, ExitStack] = {}
+
+    def claim_channel(self, channel_id: str) -> bool:
+        """Kanalni band qilish; boshqa vazifa yoki worker band qilgan bo'lsa False"""
+        if channel_id in self._claims:
+            return False
+        claim = ExitStack()
+        lock_path = JOBS_DIR / f"channel-{channel_id}.lock"
+        if not claim.enter_context(locked_file(lock_path, blocking=False)):
+            claim.close()
+            return False
+        self._claims[channel_id] = claim
+        return True
+
+    def release_channel(self, channel_id: str):
+        claim = self._claims.pop(channel_id, None)
+        if claim is not None:
+            claim.close()
+
+    def _finish(self, job: ApprovalJob):
+        if self._jobs.pop(job.id, None) is not None:
+            self.release_channel(job.channel_id)
+
+    async def submit(self, channel_id: str, user_ids: List[int], chat_id: int,
+                     message_id: int, action: str = APPROVE) -> Optional[ApprovalJob]:
+        """Vazifani saqlab, fonda ishga tushirish (darhol qaytadi)
+
+        Kanal band bo'lsa (shu yoki boshqa worker dagi vazifa, avtomatik qabul
+        paketi) None: statuslar har paketdan keyin yoziladi, ikkinchi vazifa
+        o'sha foydalanuvchilarni qayta qabul qilardi.
+        """
+        # Kanal fayllar yozilguncha ham band (orada kelgan submit rad etiladi)
+        if not self.claim_channel(channel_id):
+            return None
+        job = ApprovalJob(
+            uuid.uuid4().hex[:8], channel_id, len(user_ids), chat_id, message_id, action=action
+        )
+        self._jobs[job.id] = job
+        try:
+            await run_io(atomic_write_json, job.users_file, user_ids)
+            await run_io(job.save, lock_key=f"job:{job.channel_id}")
+        except Exception:
+            self._finish(job)
+            raise
+        self._start(job, user_ids)
+        return job
+
+    def resume_all(self):
+        """Qayta ishga tushgandan keyin tugallanmagan vazifalarni davom ettirish"""
+        for state_file in JOBS_DIR.glob("*.json"):
+            if state_file.name.endswith(".users.json"):
+                continue
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    job = ApprovalJob.from_dict(json.load(f))
+                if job.status != RUNNING:
+                    continue
+                user_ids = job.load_users()
+            except Exception as e:
+                logger.error(f"Vazifani tiklashda xato {state_file}: {e}")
+                continue
+            if not self.claim_channel(job.channel_id):
+                # Vazifa boshqa worker da hali ishlamoqda
+                logger.info(f"Vazifa {job.id} o'tkazib yuborildi: kanal {job.channel_id} band")
+                continue
+            logger.info(f"Vazifa davom ettirilmoqda {job.id}: {job.position}/{job.total}")
+            self._start(job, user_ids)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.status != RUNNING:
+            return False
+        # Joriy paket tugagach to'xtaydi
+        job.status = CANCELLED
+        return True
+
+    async def stop(self):
+        """To'xtash: vazifalar oxirgi checkpoint dan keyin davom ettiriladi"""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        for channel_id in list(self._claims):
+            self.release_channel(channel_id)
+
+    def _start(self, job: ApprovalJob, user_ids: List[int]):
+        self._jobs[job.id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, user_ids))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+
+    async def _run(self, job: ApprovalJob, user_ids: List[int]):
+        started = time.monotonic()
+        processed = 0
+        last_progress = 0.0
+
+        try:
+            await self._edit(job, self._progress_text(job, 0.0), get_job_keyboard(job.id))
+
+            while job.status == RUNNING and job.position < len(user_ids):
+                chunk = user_ids[job.position:job.position + JOB_CHUNK_SIZE]
+                chunk_started = time.monotonic()
+                result = await self.engine.run(job.channel_id, chunk, job.action)
+
+                await UserManager.set_statuses_async(job.channel_id, result.handled_statuses())
+                job.position += len(chunk)
+                job.approved += len(result.approved)
+                job.declined += len(result.declined)
+                job.failed += len(result.failed)
+                job.dropped += len(result.dropped)
+                job.elapsed += time.monotonic() - chunk_started
+                processed += len(chunk)
+                await run_io(job.save, lock_key=f"job:{job.channel_id}")
+
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    rate = processed / (last_progress - started)
+                    await self._edit(job, self._progress_text(job, rate), get_job_keyboard(job.id))
+
+            if job.status == RUNNING:
+                job.status = DONE
+            # Tugagan vazifa tiklanmaydi, fayllari kerak emas
+            await run_io(job.remove, lock_key=f"job:{job.channel_id}")
+            await self._edit(job, self._final_text(job), self.final_markup() if self.final_markup else None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Vazifa {job.id} bajarilishida xato: {e}")
+            # Holat fayli qoladi (qayta ishga tushganda davom etadi), kanal esa bo'shaydi
+            self._finish(job)
+        finally:
+            if job.status != RUNNING:
+                self._finish(job)
+
+    @staticmethod
+    def _progress_text(job: ApprovalJob, rate: float) -> str:
+        if rate > 0:
+            eta = (job.total - job.position) / rate
+            eta_text = f"~{int(eta // 60)} daq {int(eta % 60)} s"
+        else:
+            eta_text = "hisoblanmoqda..."
+        title = "So'rovlar rad etilmoqda" if job.action == DECLINE else "Foydalanuvchilar qo'shilmoqda"
+        return (
+            f"⏳ {title}...\n\n"
+            f"✅ Bajarildi: {job.position}/{job.total}\n"
+            f"❌ Muvaffaqiyatsiz: {job.failed} ta\n"
+            f"⚡ Tezlik: {rate:.1f} ta/s\n"
+            f"⏱ Qoldi: {eta_text}"
+        )
+
+    @staticmethod
+    def _final_text(job: ApprovalJob) -> str:
+        rate = job.position / job.elapsed if job.elapsed > 0 else 0.0
+        if job.action == DECLINE:
+            title = "⛔ Rad etish to'xtatildi!" if job.status == CANCELLED else "✅ So'rovlar rad etildi!"
+        else:
+            title = "⛔ Qabul qilish to'xtatildi!" if job.status == CANCELLED else "✅ So'rovlar qabul qilindi!"
+        return (
+            f"{title}\n\n"
+            f"✅ Muvaffaqiyatli: {job.approved + job.declined} ta\n"
+            f"❌ Muvaffaqiyatsiz: {job.failed} ta\n"
+            f"⚠️ Tashlab yuborildi: {job.dropped} ta\n"
+            f"📊 Jami: {job.position}/{job.total} ta\n"
+            f"⚡ Tezlik: {rate:.1f} ta/s ({job.elapsed:.1f} s)"
+        )
+
+    async def _edit(self, job: ApprovalJob, text: str, reply_markup=None):
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=job.chat_id,
+                message_id=job.message_id,
+                reply_markup=reply_markup
+            )
+        except BadRequest as e:
+            # "Message is not modified" va o'chirilgan xabarlar vazifani to'xtatmaydi
+            logger.warning(f"Vazifa {job.id} xabarini yangilab bo'lmadi: {e}")
+        except Exception as e:
+            logger.error(f"Vazifa {job.id} xabarini yangilashda xato: {e}")
+
+def get_auto_approve_policy(channel_data: dict) -> dict:
+    return {**DEFAULT_AUTO_APPROVE, **(channel_data.get('auto_approve') or {})}
+
+def in_quiet_hours(policy: dict, now: Optional[datetime] = None) -> bool:
+    """Sokin soatlar ichidami (yarim tundan o'tuvchi oraliq ham hisobga olinadi)"""
+    if not policy['quiet_hours']:
+        return False
+    start, end = policy['quiet_hours']
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+class AutoApproveScheduler:
+    """Kutilayotgan so'rovlarni kanal siyosatidagi tezlikda bir tekis qabul qilish
+
+    Har bir kanal uchun ruxsat (allowance) vaqt o'tishi bilan to'planadi va
+    har AUTO_APPROVE_TICK soniyada shuncha foydalanuvchi qabul qilinadi.
+    Barcha so'rovlar umumiy ApprovalEngine orqali o'tadi, shuning uchun
+    qo'lda ishga tushirilgan vazifalar bilan birga ham tezlik cheklovi saqlanadi.
+    Bot admin bo'lmagan va qo'lda vazifa ishlayotgan kanallar o'tkazib
+    yuboriladi; xato bergan foydalanuvchilar AUTO_APPROVE_RETRY_DELAY davomida
+    tanlanmaydi.
+    """
+
+    def __init__(self, engine: ApprovalEngine,
+                 is_admin: Optional[Callable[[str], Awaitable[bool]]] = None,
+                 job_manager: Optional["JobManager"] = None):
+        self.engine = engine
+        self.is_admin = is_admin
+        self.job_manager = job_manager
+        self._allowance: Dict[str, float] = {}
+        # channel_id -> {user_id: qayta urinish vaqti (monotonic)}
+        self._retry_after: Dict[str, Dict[int, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(AUTO_APPROVE_TICK)
+            now = time.monotonic()
+            try:
+                await self._tick(now - last)
+            except Exception as e:
+                logger.error(f"Avtomatik qabulda xato: {e}")
+            last = now
+
+    async def _can_approve(self, channel_id: str, semaphore: asyncio.Semaphore) -> bool:
+        if self.is_admin is None:
+            return True
+        try:
+            async with semaphore:
+                return await self.is_admin(channel_id)
+        except Exception as e:
+            logger.warning(f"Kanal {channel_id} adminligini tekshirib bo'lmadi: {e}")
+            return False
+
+    def _claim(self, channel_id: str) -> bool:
+        """Paket davomida kanalni band qilish (qo'lda vazifa bilan to'qnashmasin)"""
+        return self.job_manager is None or self.job_manager.claim_channel(channel_id)
+
+    def _release(self, channel_id: str):
+        if self.job_manager is not None:
+            self.job_manager.release_channel(channel_id)
+
+    def _delayed_users(self, channel_id: str) -> Set[int]:
+        """Hali qayta urinish vaqti kelmagan foydalanuvchilar"""
+        retry_after = self._retry_after.get(channel_id)
+        if not retry_after:
+            return set()
+        now = time.monotonic()
+        for user_id in [user_id for user_id, at in retry_after.items() if at <= now]:
+            del retry_after[user_id]
+        return set(retry_after)
+
+    async def _tick(self, elapsed: float):
+        candidates = []
+        for channel in ChannelManager.get_all_channels():
+            channel_id = str(channel['id'])
+            policy = get_auto_approve_policy(channel)
+            if not policy['enabled'] or in_quiet_hours(policy):
+                self._allowance.pop(channel_id, None)
+                continue
+            candidates.append((channel_id, policy))
+
+        # Adminlik tekshiruvlari parallel, ApprovalEngine bilan bir xil cheklovda
+        semaphore = asyncio.Semaphore(self.engine.concurrency)
+        allowed = await asyncio.gather(*(
+            self._can_approve(channel_id, semaphore) for channel_id, _ in candidates
+        ))
+
+        batches = []
+        for (channel_id, policy), can_approve in zip(candidates, allowed):
+            if not can_approve:
+                self._allowance.pop(channel_id, None)
+                continue
+
+            per_second = policy['rate'] / (60 if policy['per'] == "minute" else 3600)
+            # Sokin soatlardan keyin to'plangan ruxsat bir paketda sarflanmasin
+            limit = max(1.0, per_second * AUTO_APPROVE_TICK)
+            allowance = min(limit, self._allowance.get(channel_id, 0.0) + per_second * elapsed)
+            count = int(allowance)
+
+            delayed = self._delayed_users(channel_id) if count else set()
+            if count and policy['order'] == "random":
+                pending_users = [
+                    user_id for user_id in UserManager.get_join_requests(channel_id)
+                    if user_id not in delayed
+                ]
+                user_ids = random.sample(pending_users, min(count, len(pending_users)))
+            elif count:
+                # Navbat boshidagi kutilayotgan (xato bergan) foydalanuvchilar o'tkazib yuboriladi
+                user_ids = [
+                    user_id for user_id in UserManager.get_join_requests(
+                        channel_id, limit=count + len(delayed)
+                    )
+                    if user_id not in delayed
+                ][:count]
+            else:
+                user_ids = []
+
+            if user_ids and not self._claim(channel_id):
+                # Kanalda qo'lda vazifa ishlamoqda
+                self._allowance.pop(channel_id, None)
+                continue
+            self._allowance[channel_id] = allowance - len(user_ids)
+            if user_ids:
+                batches.append(self._approve(channel_id, user_ids))
+
+        await asyncio.gather(*batches)
+
+    async def _approve(self, channel_id: str, user_ids: List[int]):
+        """Paketni qabul qilish; kanal tugagach (xato bo'lsa ham) bo'shatiladi"""
+        try:
+            result = await self.engine.approve(channel_id, user_ids)
+            await UserManager.set_statuses_async(channel_id, result.handled_statuses())
+        finally:
+            self._release(channel_id)
+        if result.failed:
+            retry_at = time.monotonic() + AUTO_APPROVE_RETRY_DELAY
+            self._retry_after.setdefault(channel_id, {}).update(dict.fromkeys(result.failed, retry_at))
+
+class RetentionScheduler:
+    """Eski so'rovlar tarixini vaqti-vaqti bilan tozalash va saqlovchini siqish"""
+
+    def __init__(self, retention_days: int = HANDLED_RETENTION_DAYS,
+                 interval_hours: float = RETENTION_INTERVAL_HOURS):
+        self.retention_days = retention_days
+        self.interval = interval_hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self):
+        """(o'chirilgan yozuvlar, bo'shagan baytlar)"""
+        return await UserManager.purge_history_async(self.retention_days)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Tarixni tozalashda xato: {e}")
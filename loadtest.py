@@ -0,0 +1,296 @@
+"""Soxta Bot API serveri bilan to'liq (end-to-end) yuklama sinovi
+
+bot.build_application() dagi haqiqiy Application mahalliy FakeTelegramServer
+ga ulanadi (polling yoki webhook), so'ng:
+  1. join so'rovlar oqimi yuboriladi (kanallar bo'yicha, berilgan tezlikda;
+     --admin-every bilan oqim orasida admin kanal tafsilotlarini ochib turadi);
+  2. har bir kanal uchun admin tugmalari ketma-ketligi bosiladi
+     (Kanallar -> kanal -> Barchasini qabul qilish) va qabul qilish tugashi kutiladi;
+  3. har bir kanal CSV va JSONL ko'rinishida eksport qilinadi (sendDocument).
+Yangilanish yaratilgandan handlerlar tugaguncha bo'lgan kechikish foizliklari va
+soniyasiga qabul qilishlar JSON ko'rinishida chiqadi.
+
+Ishlatish:
+    python loadtest.py --join-requests 5000 --channels 5 --latency-ms 20 --error-rate 0.01
+    python loadtest.py --mode webhook --approval-rate 30 -o load.json
+    python loadtest.py --join-requests 5000 --admin-every 100 --latency-ms 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+from typing import Dict, List
+
+from bench import latency_summary
+from fake_telegram import BOT_USER, FakeApiConfig, FakeTelegramServer
+
+logger = logging.getLogger(__name__)
+
+# Yangilanishlar shuncha soniyada qayta ishlanmasa sinov to'xtatiladi
+DEFAULT_TIMEOUT = 300
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def join_request_update(channel_id: int, user_id: int) -> dict:
+    return {
+        "chat_join_request": {
+            "chat": {"id": channel_id, "type": "channel", "title": f"Kanal {channel_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "user_chat_id": user_id,
+            "date": int(time.time()),
+        }
+    }
+
+def callback_update(admin_id: int, data: str, message_id: int) -> dict:
+    return {
+        "callback_query": {
+            "id": f"{admin_id}-{message_id}-{data}",
+            "from": {"id": admin_id, "is_bot": False, "first_name": "Admin"},
+            "chat_instance": str(admin_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": admin_id, "type": "private", "first_name": "Admin"},
+                "from": BOT_USER,
+                "text": "👋 Admin panelga xush kelibsiz!",
+            },
+        }
+    }
+
+class UpdateTracker:
+    """Handlerlar tugagan vaqtni update_id bo'yicha yozib borish"""
+
+    def __init__(self):
+        self.done: Dict[int, float] = {}
+        self._waiters: Dict[int, asyncio.Future] = {}
+
+    async def on_update(self, update, context):
+        self.done[update.update_id] = time.monotonic()
+        waiter = self._waiters.pop(update.update_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def wait(self, update_id: int, timeout: float):
+        if update_id in self.done:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[update_id] = waiter
+        await asyncio.wait_for(waiter, timeout)
+
+    async def wait_all(self, update_ids: List[int], timeout: float):
+        deadline = time.monotonic() + timeout
+        for update_id in update_ids:
+            await self.wait(update_id, max(0.0, deadline - time.monotonic()))
+
+def latencies(server: FakeTelegramServer, tracker: UpdateTracker, update_ids: List[int]) -> List[float]:
+    created = server.state.created
+    return [(tracker.done[update_id] - created[update_id]) * 1000 for update_id in update_ids]
+
+async def run_load(args, server: FakeTelegramServer) -> dict:
+    # Muhit o'zgaruvchilari config import qilinishidan oldin o'rnatilgan
+    import bot
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    from storage import get_storage
+
+    application = bot.build_application()
+    tracker = UpdateTracker()
+    # Oxirgi guruh: oldingi guruhlardagi handlerlar tugagandan keyin chaqiriladi
+    application.add_handler(TypeHandler(Update, tracker.on_update), group=99)
+    get_storage()
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    if args.mode == "webhook":
+        await application.updater.start_webhook(
+            listen=os.environ["WEBHOOK_LISTEN"],
+            port=int(os.environ["WEBHOOK_PORT"]),
+            url_path=os.environ["WEBHOOK_URL_PATH"],
+            webhook_url=os.environ["WEBHOOK_URL"],
+            secret_token=os.environ["WEBHOOK_SECRET"],
+            allowed_updates=bot.ALLOWED_UPDATES
+        )
+    else:
+        await application.updater.start_polling(
+            poll_interval=0, timeout=10, allowed_updates=bot.ALLOWED_UPDATES
+        )
+
+    report = {}
+    try:
+        channels = [-1002000000000 - index for index in range(args.channels)]
+        admin_id = bot.ADMIN_IDS[0]
+
+        # 1. Join so'rovlar oqimi (tezlik 0 - iloji boricha tez)
+        join_ids = []
+        flood_admin_ids = []
+        started = time.monotonic()
+        for index in range(args.join_requests):
+            join_ids.append(server.state.enqueue(
+                join_request_update(channels[index % len(channels)], 500000000 + index)
+            ))
+            if args.admin_every and index % args.admin_every == 0:
+                # Og'ir admin amali (statistika + get_chat_member) oqim davomida
+                channel_id = channels[(index // args.admin_every) % len(channels)]
+                flood_admin_ids.append(server.state.enqueue(
+                    callback_update(admin_id, f"channel_{channel_id}", len(flood_admin_ids) + 1)
+                ))
+            if args.rate:
+                delay = started + (index + 1) / args.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif index % 500 == 0:
+                await asyncio.sleep(0)
+        await tracker.wait_all(join_ids + flood_admin_ids, args.timeout)
+        elapsed = max(tracker.done[update_id] for update_id in join_ids) - started
+        report["join_requests"] = {
+            "count": len(join_ids),
+            "duration_s": round(elapsed, 3),
+            "updates_per_s": round(len(join_ids) / elapsed, 1),
+            **latency_summary(latencies(server, tracker, join_ids)),
+        }
+        if flood_admin_ids:
+            report["admin_during_flood"] = {
+                "count": len(flood_admin_ids),
+                **latency_summary(latencies(server, tracker, flood_admin_ids)),
+            }
+
+        # 2. Admin tugmalari va qabul qilish
+        job_manager = application.bot_data['job_manager']
+        actions: Dict[str, List[int]] = {}
+        approvals_before = server.state.approvals_count()
+        approve_started = time.monotonic()
+        for message_id, channel_id in enumerate(channels, start=1):
+            for action, data in (
+                ("channels_list", "channels_list"),
+                ("channel_details", f"channel_{channel_id}"),
+                ("accept_all", f"accept_all_{channel_id}"),
+            ):
+                update_id = server.state.enqueue(callback_update(admin_id, data, message_id))
+                await tracker.wait(update_id, args.timeout)
+                actions.setdefault(action, []).append(update_id)
+
+        # Fon vazifalari tugashini kutish
+        deadline = time.monotonic() + args.timeout
+        while any(not task.done() for task in job_manager._tasks.values()):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Qabul qilish vazifalari vaqtida tugamadi")
+            await asyncio.sleep(0.05)
+        approve_elapsed = time.monotonic() - approve_started
+        approved = server.state.approvals_count() - approvals_before
+
+        report["admin_actions"] = {
+            action: latency_summary(latencies(server, tracker, update_ids))
+            for action, update_ids in actions.items()
+        }
+        report["approvals"] = {
+            "approved": approved,
+            "duration_s": round(approve_elapsed, 3),
+            "approvals_per_s": round(approved / approve_elapsed, 1) if approve_elapsed else None,
+            "injected_errors": dict(server.state.injected),
+        }
+
+        # 3. Eksport (fayl soxta serverga multipart/form-data bilan yuklanadi)
+        export_ids = []
+        uploads_before = server.state.uploads
+        upload_bytes_before = server.state.upload_bytes
+        for message_id, channel_id in enumerate(channels, start=len(channels) + 1):
+            for fmt in ("csv", "jsonl"):
+                update_id = server.state.enqueue(
+                    callback_update(admin_id, f"export_{fmt}_{channel_id}", message_id)
+                )
+                await tracker.wait(update_id, args.timeout)
+                export_ids.append(update_id)
+        report["exports"] = {
+            "count": len(export_ids),
+            "uploaded": server.state.uploads - uploads_before,
+            "upload_bytes": server.state.upload_bytes - upload_bytes_before,
+            **latency_summary(latencies(server, tracker, export_ids)),
+        }
+        report["api_calls"] = dict(server.state.calls)
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Soxta Bot API bilan yuklama sinovi")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--backend", default="json", help="saqlash turi (json yoki sqlite)")
+    parser.add_argument("--join-requests", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="join so'rovlar tezligi (soniyasiga, 0 - cheklovsiz)")
+    parser.add_argument("--admin-every", type=int, default=0,
+                        help="har shuncha join so'rovda admin kanal tafsilotlarini ochadi (0 - yo'q)")
+    parser.add_argument("--approval-rate", type=float, default=None,
+                        help="botning qabul qilish tezligi (APPROVAL_RATE)")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--flood-limit", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("-o", "--output", help="natija fayli (ko'rsatilmasa stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.output:
+        # Ish papkasi o'zgarishidan oldin
+        args.output = os.path.abspath(args.output)
+
+    server = FakeTelegramServer(FakeApiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        flood_limit=args.flood_limit,
+    ))
+    server.start()
+
+    # Bot fayllari (channels/, jobs/, ...) vaqtinchalik papkada yaratiladi
+    workdir = tempfile.mkdtemp(prefix="accepter-load-")
+    os.chdir(workdir)
+    os.environ.update(BOT_API_URL=server.base_url, STORAGE_BACKEND=args.backend)
+    if args.approval_rate:
+        os.environ["APPROVAL_RATE"] = str(args.approval_rate)
+    if args.mode == "webhook":
+        port = free_port()
+        os.environ.update(
+            WEBHOOK_LISTEN="127.0.0.1",
+            WEBHOOK_PORT=str(port),
+            WEBHOOK_URL_PATH="webhook",
+            WEBHOOK_URL=f"http://127.0.0.1:{port}/webhook",
+            WEBHOOK_SECRET="loadtest-secret",
+        )
+
+    try:
+        report = asyncio.run(run_load(args, server))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"mode": args.mode, "backend": args.backend, "settings": vars(args), **report}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Ichki o'lchovlar: handlerlar, Bot API va saqlash qatlami vaqtlari
+
+Qiymatlar jarayon xotirasida yig'iladi, Prometheus text formatida
+METRICS_PORT da beriladi (MetricsServer) va /stats da qisqacha ko'rsatiladi.
+"""
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Barcha o'lchovlar nomi shu bilan boshlanadi
+METRIC_PREFIX = "accepter"
+
+# Vaqt gistogrammalari chegaralari (soniya)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tezlik (soniyasiga) shuncha soniyalik oyna bo'yicha hisoblanadi
+RATE_WINDOW = 60
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    """Prometheus gistogrammasi: chegaralar bo'yicha sanoq, yig'indi va maksimum"""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Taxminiy kvantil (tegishli chegaraning yuqori qiymati)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+class RateMeter:
+    """Oxirgi RATE_WINDOW soniyadagi hodisalar (soniyalik halqa bufer)"""
+
+    def __init__(self, window: int = RATE_WINDOW):
+        self.window = window
+        self._counts = [0] * window
+        self._seconds = [0] * window
+
+    def add(self, count: int = 1):
+        second = int(time.time())
+        slot = second % self.window
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += count
+
+    def rate(self) -> float:
+        now = int(time.time())
+        total = sum(
+            count for count, second in zip(self._counts, self._seconds)
+            if now - second < self.window
+        )
+        return total / self.window
+
+class Metrics:
+    """Jarayon bo'yicha umumiy o'lchovlar reyestri (oqimlar uchun xavfsiz)"""
+
+    _lock = threading.Lock()
+    _histograms: Dict[str, Dict[Labels, Histogram]] = {}
+    _counters: Dict[str, Dict[Labels, float]] = {}
+    _rates: Dict[str, RateMeter] = {}
+    _started = time.time()
+
+    @staticmethod
+    def _labels(labels: dict) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @staticmethod
+    def observe(name: str, seconds: float, **labels):
+        key = Metrics._labels(labels)
+        with Metrics._lock:
+            series = Metrics._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(seconds)
+
+    @staticmethod
+    def inc(name: str, value: float = 1, **labels):
+        key = Metrics._labels(labels)
+        with Metrics._lock:
+            series = Metrics._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @staticmethod
+    def mark(name: str, count: int = 1):
+        """Hodisani sanash: <name>_total hisoblagichi va soniyasiga tezlik"""
+        with Metrics._lock:
+            if name not in Metrics._rates:
+                Metrics._rates[name] = RateMeter()
+            Metrics._rates[name].add(count)
+        Metrics.inc(f"{name}_total", count)
+
+    @staticmethod
+    @contextmanager
+    def timer(name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            Metrics.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def timed(handler: str):
+        """Async handler uchun dekorator: handler_seconds va handler_errors_total"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    Metrics.inc("handler_errors_total", handler=handler)
+                    raise
+                finally:
+                    Metrics.observe("handler_seconds", time.perf_counter() - started, handler=handler)
+            return wrapper
+        return decorator
+
+    # --- O'qish ---
+
+    @staticmethod
+    def histograms(name: str) -> Dict[str, Histogram]:
+        """{birinchi label qiymati: gistogramma} (nusxa)"""
+        with Metrics._lock:
+            series = dict(Metrics._histograms.get(name, {}))
+        return {(key[0][1] if key else ""): histogram for key, histogram in series.items()}
+
+    @staticmethod
+    def counter(name: str, **labels) -> float:
+        """Hisoblagich qiymati; labels berilmasa barcha qatorlar yig'indisi"""
+        key = Metrics._labels(labels)
+        with Metrics._lock:
+            series = Metrics._counters.get(name, {})
+            if labels:
+                return series.get(key, 0)
+            return sum(series.values())
+
+    @staticmethod
+    def counters(name: str) -> Dict[Labels, float]:
+        with Metrics._lock:
+            return dict(Metrics._counters.get(name, {}))
+
+    @staticmethod
+    def rate(name: str) -> float:
+        with Metrics._lock:
+            meter = Metrics._rates.get(name)
+        return meter.rate() if meter else 0.0
+
+    @staticmethod
+    def uptime() -> float:
+        return time.time() - Metrics._started
+
+    @staticmethod
+    def render() -> str:
+        """Prometheus text exposition formati"""
+
+        def labels_text(key: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+        lines: List[str] = []
+        with Metrics._lock:
+            for name, series in sorted(Metrics._counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{labels_text(key)} {value:g}")
+
+            for name, series in sorted(Metrics._histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.buckets):
+                        cumulative += count
+                        lines.append(
+                            f"{metric}_bucket{labels_text(key, ('le', str(bound)))} {cumulative}"
+                        )
+                    lines.append(f"{metric}_sum{labels_text(key)} {histogram.total:g}")
+                    lines.append(f"{metric}_count{labels_text(key)} {histogram.count}")
+
+            for name, meter in sorted(Metrics._rates.items()):
+                metric = f"{METRIC_PREFIX}_{name}_per_second"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {meter.rate():g}")
+
+        metric = f"{METRIC_PREFIX}_uptime_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {Metrics.uptime():.0f}")
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = Metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    """GET /metrics ni fon oqimida berish"""
+
+    def __init__(self, listen: str, port: int):
+        self.listen = listen
+        self.port = port
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        if not self.port:
+            return
+        self._httpd = ThreadingHTTPServer((self.listen, self.port), MetricsHandler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Metrikalar: http://{self.listen}:{self.port}/metrics")
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
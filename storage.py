@@ -0,0 +1,2127 @@
+import asyncio
+import functools
+import json
+import os
+import sys
+import logging
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from pathlib import Path
+
+from config import STORAGE_BACKEND, STORAGE_MULTIPROCESS, SQLITE_FILE
+from metrics import Metrics
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: jarayonlararo fayl qulflari yo'q - faqat bitta jarayon ishlaydi
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Papkalar
+CHANNELS_DIR = Path("channels")
+CHANNELS_DIR.mkdir(exist_ok=True)
+
+# Barcha kanallar bitta indeks faylida (kanal fayllari bilan birga yuritiladi)
+CHANNELS_INDEX_FILE = CHANNELS_DIR / "index.json"
+
+# Kanallar indeksini (o'qish-o'zgartirish-yozish) jarayonlar navbat bilan yangilaydi
+CHANNELS_LOCK_FILE = CHANNELS_DIR / "index.lock"
+
+# Admin o'chirgan kanallar: {channel_id: o'chirilgan vaqt}. Tarix tozalanganda
+# faqat shu kanallarning so'rovlari butunlay o'chiriladi (ro'yxatda yo'q, lekin
+# o'chirilmagan kanal so'rovlari - masalan hali ro'yxatga olinmagani - qoladi)
+CHANNELS_DELETED_FILE = CHANNELS_DIR / "deleted.json"
+
+# Kanallar keshi shuncha soniyadan keyin manbadagi o'zgarishlarni tekshiradi
+CHANNEL_CACHE_TTL = 60
+
+# Kanal so'rovlari: channels/<id>/requests.json (snapshot) va jurnal
+REQUESTS_FILE = "requests.json"
+REQUESTS_JOURNAL_FILE = "requests.journal.jsonl"
+
+# Kanal fayllari uchun jarayonlararo qulflar (yozish/yuklash va siqish)
+REQUESTS_LOCK_FILE = "requests.lock"
+REQUESTS_COMPACT_LOCK_FILE = "requests.compact.lock"
+
+# Snapshot ko'rinishi versiyasi (1 - eski user_id -> kanal -> so'rovlar ro'yxati)
+SNAPSHOT_VERSION = 2
+
+# Tez yuklash uchun ikkilik snapshot: sarlavha (belgi, versiya, qatorlar soni,
+# CRC32) va ustunlar baytlari (little-endian). U yo'q yoki buzilgan bo'lsa
+# JSON snapshot (requests.json) o'qiladi.
+BINARY_SNAPSHOT_FILE = "requests.bin"
+BINARY_MAGIC = b"ACRQ"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHQI")
+# Bitta qator: user_id (8) + vaqt (8) + status (1) bayt
+BINARY_ROW_SIZE = 17
+
+# Eski (kanallarga bo'linmagan) so'rovlar fayli va jurnali -
+# birinchi ishga tushishda kanallar bo'yicha fayllarga ko'chiriladi
+USERS_FILE = "users.json"
+USERS_JOURNAL_FILE = "users.journal.jsonl"
+
+# So'rov statuslari diskda va xotirada bitta bayt kod sifatida saqlanadi
+# (kodlar tartib raqami - yangi statuslar faqat oxiriga qo'shiladi)
+STATUSES = ("pending", "approved", "dropped", "declined")
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+PENDING = STATUS_CODES["pending"]
+DROPPED = STATUS_CODES["dropped"]
+
+# Kanal jurnali shuncha baytga yetganda snapshot ga siqiladi
+# (jurnalga bir nechta jarayon yozadi, shuning uchun qatorlar emas, fayl hajmi)
+JOURNAL_COMPACT_BYTES = 512 * 1024
+
+# Yozuvlar diskka paketlab yoziladi: har shuncha yozuvda yoki shuncha ms da
+FLUSH_RECORDS = 500
+FLUSH_INTERVAL_MS = 200
+
+# Boshqa jarayonlar jurnalga yozgan qatorlar shuncha ms da bir o'qiladi
+FOLLOW_INTERVAL_MS = 200
+
+# Disk bilan ishlash uchun alohida oqimlar soni (event loop bloklanmasligi uchun)
+STORAGE_WORKERS = 4
+
+# Kanal so'rovlari (eksport uchun) shuncha qatorli bo'laklarda o'qiladi
+EXPORT_CHUNK_ROWS = 10000
+
+# SQLite boshqa ulanish (VACUUM, boshqa jarayon) yozayotganda shuncha soniya kutadi
+SQLITE_BUSY_TIMEOUT = 60
+
+# Statistika uchun soatlik hisoblagichlar chuqurligi (30 kun)
+STATS_HOURS = 30 * 24
+
+# Kutilayotganlar tartibi (sahifalash uchun) o'chirilganlar shuncha va tiriklar
+# sonidan oshganda qayta quriladi
+PENDING_ORDER_COMPACT_MIN = 1024
+
+def write_json_tmp(file_path, data, indent: Optional[int] = 2) -> str:
+    """JSON ni file_path yonidagi vaqtinchalik faylga yozish (os.replace uchun)"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+def write_bytes_tmp(file_path, data: bytes) -> str:
+    """Baytlarni file_path yonidagi vaqtinchalik faylga yozish (os.replace uchun)"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+def atomic_write_json(file_path, data, indent: Optional[int] = 2):
+    """JSON faylni vaqtinchalik fayl va os.replace orqali yozish"""
+    os.replace(write_json_tmp(file_path, data, indent), file_path)
+
+@contextmanager
+def locked_file(lock_path, shared: bool = False, blocking: bool = True):
+    """Jarayonlararo maslahat qulfi (flock) lock_path fayli orqali
+
+    blocking=False bo'lsa va qulf band bo'lsa, kutilmaydi - False beriladi.
+    Qulf ochilgan faylga bog'liq, shuning uchun bitta jarayon oqimlarini ham
+    ajratadi; bir oqimda ichma-ich olinmaydi.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(fd, flags if blocking else flags | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+class WriteBuffer:
+    """Yozuvlarni yig'ib, har FLUSH_RECORDS ta yoki FLUSH_INTERVAL_MS da bitta paketda yozish
+
+    Diskka yozish fon oqimida bo'ladi, shuning uchun so'rovlar oqimi qanchalik
+    tez bo'lmasin, yozishlar soni T ms da bittadan oshmaydi.
+    """
+
+    def __init__(self, flush_func, max_records: int = FLUSH_RECORDS,
+                 interval_ms: int = FLUSH_INTERVAL_MS, name: str = "write-buffer"):
+        self._flush_func = flush_func
+        self._name = name
+        self._max_records = max_records
+        self._interval = interval_ms / 1000
+        self._items = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def add(self, item):
+        with self._cond:
+            self._items.append(item)
+            if len(self._items) >= self._max_records:
+                self._cond.notify()
+
+    def flush(self, then=None):
+        """Buferni yozish; then berilsa, u ham shu qulf ostida (yangi paketlarsiz) bajariladi"""
+        # Paketlar tartibi saqlanishi uchun bir vaqtda faqat bitta flush
+        with self._flush_lock:
+            with self._cond:
+                items, self._items = self._items, []
+            if items:
+                with Metrics.timer("storage_flush_seconds", buffer=self._name):
+                    self._flush_func(items)
+                Metrics.inc("storage_flushed_records_total", len(items), buffer=self._name)
+            if then is not None:
+                return then()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._items) < self._max_records:
+                    self._cond.wait(self._interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Yozuvlarni diskka yozishda xato: {e}")
+            if closed:
+                return
+
+    def close(self):
+        """Qolgan yozuvlarni yozib, fon oqimini to'xtatish"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+def parse_epoch(value) -> int:
+    """Vaqtni epoch soniyaga o'tkazish (eski yozuvlarda ISO satr)"""
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
+
+class ChannelRequests:
+    """Bitta kanal so'rovlari ustunli massivlarda
+
+    Har bir so'rov uchta massivda bitta qator: user_id va vaqt (epoch) uchun
+    array('q'), status kodi uchun array('b'). Qatorlar kelish tartibida,
+    shuning uchun vaqt oralig'i bisect bilan topiladi. pending - kutilayotgan
+    so'rovlar: {user_id: qator}.
+    """
+
+    __slots__ = ("user_ids", "timestamps", "statuses", "pending")
+
+    def __init__(self):
+        self.user_ids = array('q')
+        self.timestamps = array('q')
+        self.statuses = array('b')
+        self.pending: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def _track_pending(self, user_id: int, row: int):
+        # Foydalanuvchining kanalda bitta faol so'rovi bo'ladi - birinchisi
+        # (kutish vaqti birinchi so'rovdan hisoblanadi, SQLite dagi MIN(ts) kabi);
+        # takroriy so'rov tashlab yuborilgan sifatida qayd qilinadi
+        if user_id in self.pending:
+            self.statuses[row] = DROPPED
+        else:
+            self.pending[user_id] = row
+
+    def append(self, user_id: int, ts: int, status: int = PENDING):
+        row = len(self.user_ids)
+        self.user_ids.append(user_id)
+        self.timestamps.append(ts)
+        self.statuses.append(status)
+        if status == PENDING:
+            self._track_pending(user_id, row)
+
+    def set_status(self, user_id: int, status: int) -> bool:
+        if status == PENDING:
+            return False
+        row = self.pending.pop(user_id, None)
+        if row is None:
+            return False
+        self.statuses[row] = status
+        return True
+
+    def pending_users(self, since: Optional[int] = None) -> List[int]:
+        """Kutilayotgan foydalanuvchilar (eskidan yangiga), since dan keyingilari"""
+        if since is None:
+            return list(self.pending)
+        recent = []
+        for user_id in reversed(self.pending):
+            if self.timestamps[self.pending[user_id]] < since:
+                break
+            recent.append(user_id)
+        recent.reverse()
+        return recent
+
+    def timestamps_since(self, since: int):
+        return self.timestamps[bisect_left(self.timestamps, since):]
+
+    def purge(self, before: int) -> int:
+        """before dan eski qayta ishlangan so'rovlarni o'chirish"""
+        rows = [
+            row for row, (ts, status) in enumerate(zip(self.timestamps, self.statuses))
+            if status == PENDING or ts >= before
+        ]
+        removed = len(self.user_ids) - len(rows)
+        if removed:
+            self._set_columns(
+                array('q', (self.user_ids[row] for row in rows)),
+                array('q', (self.timestamps[row] for row in rows)),
+                array('b', (self.statuses[row] for row in rows))
+            )
+        return removed
+
+    def _set_columns(self, user_ids: array, timestamps: array, statuses: array):
+        self.user_ids, self.timestamps, self.statuses = user_ids, timestamps, statuses
+        self.pending = {}
+        # Faqat kutilayotgan qatorlar bo'ylab (bytes.find C da qidiradi)
+        codes = statuses.tobytes()
+        row = codes.find(PENDING)
+        while row != -1:
+            self._track_pending(user_ids[row], row)
+            row = codes.find(PENDING, row + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "user_ids": self.user_ids.tolist(),
+            "timestamps": self.timestamps.tolist(),
+            "statuses": self.statuses.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ChannelRequests':
+        requests = cls()
+        requests._set_columns(
+            array('q', data["user_ids"]),
+            array('q', data["timestamps"]),
+            array('b', data["statuses"])
+        )
+        return requests
+
+    def to_bytes(self) -> bytes:
+        user_ids, timestamps = self.user_ids, self.timestamps
+        if sys.byteorder == "big":
+            user_ids, timestamps = array('q', user_ids), array('q', timestamps)
+            user_ids.byteswap()
+            timestamps.byteswap()
+        payload = user_ids.tobytes() + timestamps.tobytes() + self.statuses.tobytes()
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(self), zlib.crc32(payload))
+        return header + payload
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ChannelRequests':
+        """Ikkilik snapshot; buzilgan bo'lsa ValueError"""
+        if len(data) < BINARY_HEADER.size:
+            raise ValueError("fayl sarlavhadan qisqa")
+        magic, version, rows, checksum = BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise ValueError("noto'g'ri fayl belgisi")
+        if version != BINARY_VERSION:
+            raise ValueError(f"noma'lum versiya: {version}")
+        payload = memoryview(data)[BINARY_HEADER.size:]
+        if len(payload) != rows * BINARY_ROW_SIZE:
+            raise ValueError(f"hajm mos emas: {len(payload)} bayt, {rows} qator")
+        if zlib.crc32(payload) != checksum:
+            raise ValueError("CRC32 mos emas")
+
+        user_ids, timestamps, statuses = array('q'), array('q'), array('b')
+        user_ids.frombytes(payload[:rows * 8])
+        timestamps.frombytes(payload[rows * 8:rows * 16])
+        statuses.frombytes(payload[rows * 16:])
+        if sys.byteorder == "big":
+            user_ids.byteswap()
+            timestamps.byteswap()
+
+        requests = cls()
+        requests._set_columns(user_ids, timestamps, statuses)
+        return requests
+
+def apply_journal_entry(requests: ChannelRequests, entry: dict, seen: Optional[Set] = None):
+    """Bitta jurnal qatorini kanal holatiga qo'llash
+
+    seen berilsa ((user_id, vaqt) juftliklari), takroriy join qatorlari
+    tashlab yuboriladi (siqish paytida uzilgan jurnal qayta o'qilganda).
+    """
+    op = entry.get("op")
+    if op == "status":
+        for user_id, status in entry["statuses"].items():
+            requests.set_status(int(user_id), STATUS_CODES[status])
+    elif op == "purge":
+        requests.purge(parse_epoch(entry["before"]))
+    else:
+        user_id = int(entry["user_id"])
+        # Eski qatorlarda vaqt ISO ko'rinishida ("timestamp")
+        ts = parse_epoch(entry.get("ts", entry.get("timestamp")))
+        if seen is not None:
+            if (user_id, ts) in seen:
+                return
+            seen.add((user_id, ts))
+        requests.append(user_id, ts, STATUS_CODES[entry.get("status", "pending")])
+
+class BaseStorage:
+    """Saqlash qatlami interfeysi"""
+
+    def save_channel(self, channel_id: str, data: dict):
+        raise NotImplementedError
+
+    def delete_channel(self, channel_id: str):
+        """Kanalni o'chirish va o'chirilganini (tombstone) qayd qilish"""
+        raise NotImplementedError
+
+    def deleted_channels(self) -> Dict[str, float]:
+        """O'chirilgan va hali tozalanmagan kanallar: {channel_id: o'chirilgan vaqt}"""
+        raise NotImplementedError
+
+    def forget_deleted_channels(self, channel_ids: Set[str]):
+        raise NotImplementedError
+
+    def load_channel_index(self) -> Dict[str, dict]:
+        """Barcha kanallar: {channel_id: ma'lumot}"""
+        raise NotImplementedError
+
+    def channel_index_version(self):
+        """Kanallar indeksi o'zgarganini aniqlash uchun arzon belgi"""
+        raise NotImplementedError
+
+    def add_join_request(self, user_id: int, channel_id: str, timestamp: datetime):
+        raise NotImplementedError
+
+    def set_statuses(self, channel_id: str, statuses: Dict[int, str]):
+        """Kutilayotgan so'rovlar statusini bitta paketda yangilash"""
+        raise NotImplementedError
+
+    def get_join_requests(self, channel_id: str,
+                          time_range: Optional[timedelta] = None) -> List[int]:
+        raise NotImplementedError
+
+    def count_join_requests(self, channel_id: str,
+                            time_range: Optional[timedelta] = None) -> int:
+        return len(self.get_join_requests(channel_id, time_range))
+
+    def iter_join_requests(self) -> Iterator[Tuple[int, str, datetime, str]]:
+        """Barcha so'rovlar: (user_id, channel_id, vaqt, status)"""
+        raise NotImplementedError
+
+    def iter_channel_requests(self, channel_id: str,
+                              chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[Tuple[int, int, str]]]:
+        """Kanalning barcha so'rovlari kelish tartibida, bo'laklab: [(user_id, epoch, status)]
+
+        Xotirada bir vaqtda bitta bo'lak turadi (kanal qanchalik katta bo'lmasin).
+        """
+        raise NotImplementedError
+
+    def iter_pending(self) -> Iterator[Tuple[str, int, float]]:
+        """Kutilayotgan so'rovlar vaqt bo'yicha: (channel_id, user_id, epoch)"""
+        pending = [
+            (timestamp.timestamp(), channel_id, user_id)
+            for user_id, channel_id, timestamp, status in self.iter_join_requests()
+            if status == "pending"
+        ]
+        pending.sort()
+        for ts, channel_id, user_id in pending:
+            yield channel_id, user_id, ts
+
+    def iter_hourly_joins(self, since: float) -> Iterator[Tuple[str, int, int]]:
+        """since dan keyingi so'rovlar soat bo'yicha: (channel_id, soat, soni)"""
+        counts: Dict[Tuple[str, int], int] = {}
+        for _, channel_id, timestamp, _ in self.iter_join_requests():
+            ts = timestamp.timestamp()
+            if ts >= since:
+                key = (channel_id, int(ts // 3600))
+                counts[key] = counts.get(key, 0) + 1
+        for (channel_id, hour), count in counts.items():
+            yield channel_id, hour, count
+
+    def purge(self, before: float, deleted: Dict[str, float]) -> Tuple[int, List[str]]:
+        """before dan eski qayta ishlangan so'rovlarni va deleted dagi kanallar
+        ma'lumotlarini o'chirish; (o'chirilgan yozuvlar, butunlay o'chirilgan kanallar)
+
+        Kutilayotgan so'rovlar o'chirilmaydi: o'chirilgan kanalga undan keyin
+        so'rov kelgan bo'lsa, kanal ma'lumotlari saqlanadi.
+        """
+        raise NotImplementedError
+
+    def storage_size(self) -> int:
+        """So'rovlar egallagan disk hajmi (bayt)"""
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        raise NotImplementedError
+
+    def set_change_listener(self, listener):
+        """Boshqa jarayonlar yozgan so'rovlar uchun listener(channel_id, jurnal qatorlari)"""
+        pass
+
+    def flush(self):
+        """Buferdagi yozuvlarni darhol diskka yozish"""
+        pass
+
+    def close(self):
+        pass
+
+class ChannelShard:
+    """Bitta kanal so'rovlari: channels/<id>/requests.json (snapshot) + jurnal
+
+    Har bir kanalning o'z qulfi, jurnali va siqishi bor, shuning uchun
+    band kanal boshqa kanallardagi yozish va o'qishni sekinlashtirmaydi.
+    Jarayon ichida jurnalga faqat JsonStorage ning umumiy WriteBuffer oqimi yozadi.
+
+    Bitta papka bilan bir nechta jarayon ishlashi mumkin (masalan, balanser
+    ortidagi webhook workerlar): jurnalga yozish, aylantirish va yuklash
+    requests.lock qulfi (flock) ostida, siqish esa requests.compact.lock
+    bilan bir vaqtda faqat bitta jarayonda bajariladi. Boshqa jarayonlar
+    yozgan qatorlar follow() orqali xotiradagi holatga qo'shib boriladi.
+    """
+
+    def __init__(self, channel_id: str):
+        self.channel_id = channel_id
+        self.directory = CHANNELS_DIR / channel_id
+        self.snapshot_file = self.directory / REQUESTS_FILE
+        self.binary_snapshot_file = self.directory / BINARY_SNAPSHOT_FILE
+        self.journal_file = self.directory / REQUESTS_JOURNAL_FILE
+        self.old_journal_file = self.directory / f"{REQUESTS_JOURNAL_FILE}.old"
+        self.lock_file = self.directory / REQUESTS_LOCK_FILE
+        self.compact_lock_file = self.directory / REQUESTS_COMPACT_LOCK_FILE
+        self.requests = ChannelRequests()
+        self.lock = threading.RLock()
+        # Yozish uchun jurnal (fd) va boshqa jarayonlar qatorlarini o'qish uchun fayl;
+        # ikkalasi ham _io_lock ostida ishlatiladi
+        self._journal: Optional[int] = None
+        self._reader = None
+        self._reader_inode: Optional[int] = None
+        self._io_lock = threading.Lock()
+        # Yozish paytida o'qilgan, holatga hali qo'llanmagan boshqa jarayonlar qatorlari
+        self._unapplied: List[dict] = []
+        self._compacting = False
+        self._compaction_thread: Optional[threading.Thread] = None
+
+    def file_lock(self, shared: bool = False):
+        """Kanal fayllari uchun jarayonlararo qulf (ichma-ich olinmaydi)"""
+        self.directory.mkdir(exist_ok=True)
+        return locked_file(self.lock_file, shared)
+
+    def _read_snapshot(self) -> Tuple[ChannelRequests, bool]:
+        """Snapshot holati va u ikkilik fayldan o'qilganmi
+
+        Ikkilik snapshot bitta o'qish bilan yuklanadi; u yo'q yoki buzilgan
+        bo'lsa JSON snapshot ishlatiladi.
+        """
+        if self.binary_snapshot_file.exists():
+            try:
+                with open(self.binary_snapshot_file, 'rb') as f:
+                    return ChannelRequests.from_bytes(f.read()), True
+            except (OSError, ValueError) as e:
+                logger.error(
+                    f"Kanal {self.channel_id} ikkilik snapshoti o'qilmadi, JSON dan yuklanadi: {e}"
+                )
+        if not self.snapshot_file.exists():
+            return ChannelRequests(), False
+        with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+            return ChannelRequests.from_dict(json.load(f)), False
+
+    def _snapshot_data(self, requests: ChannelRequests) -> dict:
+        return {"version": SNAPSHOT_VERSION, **requests.to_dict()}
+
+    def _write_snapshot_files(self, requests: ChannelRequests) -> List[Tuple[str, Path]]:
+        """Ikkilik va JSON snapshot larni vaqtinchalik fayllarga yozish: [(tmp, fayl)]"""
+        return [
+            (write_bytes_tmp(self.binary_snapshot_file, requests.to_bytes()),
+             self.binary_snapshot_file),
+            (write_json_tmp(self.snapshot_file, self._snapshot_data(requests), indent=None),
+             self.snapshot_file),
+        ]
+
+    def write_snapshot(self, requests: ChannelRequests):
+        self.directory.mkdir(exist_ok=True)
+        for tmp_path, file_path in self._write_snapshot_files(requests):
+            os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def _replay_journal(requests: ChannelRequests, journal_path: Path,
+                        skip_duplicates: bool = False) -> int:
+        """Aylantirilgan (o'zgarmaydigan) jurnalni holatga qo'llash,
+        qo'llangan qatorlar sonini qaytaradi"""
+        if not journal_path.exists():
+            return 0
+
+        applied = 0
+        seen = set(zip(requests.user_ids, requests.timestamps)) if skip_duplicates else None
+        with open(journal_path, 'rb') as f:
+            for entry in ChannelShard._read_entries(f):
+                apply_journal_entry(requests, entry, seen)
+                applied += 1
+        return applied
+
+    @staticmethod
+    def _read_entries(f) -> List[dict]:
+        """Fayldagi joriy o'rindan oxirgi to'liq qatorgacha o'qish
+
+        Chala qator o'qilmaydi va o'rin uning boshida qoladi.
+        """
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.seek(end - len(data), os.SEEK_CUR)
+
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Jurnaldagi buzilgan qator tashlab yuborildi: {f.name}")
+        return entries
+
+    def _open_reader(self):
+        # Jurnal yo'q bo'lsa bo'sh holda yaratiladi - boshqa jarayon unga yozib,
+        # aylantirib ulgurgan bo'lsa ham qatorlari o'tkazib yuborilmaydi
+        fd = os.open(self.journal_file, os.O_RDONLY | os.O_CREAT, 0o644)
+        self._reader = os.fdopen(fd, 'rb')
+        self._reader_inode = os.fstat(fd).st_ino
+
+    def _follow_journal(self) -> List[dict]:
+        """Jurnalning oxirgi o'qilgan joyidan keyingi qatorlar (qulf ostida)
+
+        Jurnal aylantirilgan bo'lsa, eski fayl oxirigacha o'qilib,
+        yangi jurnalga o'tiladi.
+        """
+        if self._reader is None:
+            self._open_reader()
+
+        entries = self._read_entries(self._reader)
+        if self._journal_inode() != self._reader_inode:
+            self._reader.close()
+            self._open_reader()
+            entries.extend(self._read_entries(self._reader))
+        return entries
+
+    def _journal_size(self) -> int:
+        try:
+            return self.journal_file.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _journal_inode(self) -> Optional[int]:
+        try:
+            return self.journal_file.stat().st_ino
+        except FileNotFoundError:
+            return None
+
+    def _has_new_lines(self) -> bool:
+        if self._reader is None:
+            return True
+        return (os.fstat(self._reader.fileno()).st_size > self._reader.tell()
+                or self._journal_inode() != self._reader_inode)
+
+    def _open_journal(self) -> int:
+        """Yozish uchun jurnal (boshqa jarayon aylantirgan bo'lsa, yangisi ochiladi)"""
+        if self._journal is not None and self._journal_inode() != os.fstat(self._journal).st_ino:
+            os.close(self._journal)
+            self._journal = None
+        if self._journal is None:
+            self._journal = os.open(
+                self.journal_file, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644
+            )
+        return self._journal
+
+    def _repair_journal(self, fd: int):
+        """Oxirgi chala qatorni kesish (yozish paytida uzilgan jarayondan qolgan),
+        aks holda keyingi yozuv unga yopishib qoladi"""
+        size = os.fstat(fd).st_size
+        if not size or os.pread(fd, 1, size - 1) == b"\n":
+            return
+        data = os.pread(fd, size, 0)
+        os.ftruncate(fd, data.rfind(b"\n") + 1)
+        logger.warning(f"Jurnal oxiridagi chala qator kesib tashlandi: {self.journal_file}")
+
+    def load(self):
+        with self._io_lock, self.file_lock():
+            requests, from_binary = self._read_snapshot()
+            if not from_binary and len(requests):
+                # Ikkilik snapshot hali yo'q (yangilangan o'rnatma) yoki buzilgan -
+                # keyingi ishga tushish JSON ni qayta o'qimasligi uchun yoziladi
+                os.replace(
+                    write_bytes_tmp(self.binary_snapshot_file, requests.to_bytes()),
+                    self.binary_snapshot_file
+                )
+            # Siqish tugamay qolgan bo'lsa, eski jurnal ham qo'llanadi
+            self._replay_journal(requests, self.old_journal_file, skip_duplicates=True)
+            self._repair_journal(self._open_journal())
+            for entry in self._follow_journal():
+                apply_journal_entry(requests, entry)
+            self.requests = requests
+
+        if self.old_journal_file.exists():
+            self._start_compaction()
+
+    def follow(self) -> List[dict]:
+        """Boshqa jarayonlar jurnalga yozgan qatorlarni xotiradagi holatga qo'llash
+
+        Qo'llangan qatorlar qaytariladi (indekslarni yangilash uchun).
+        """
+        if not self.directory.is_dir():
+            # Kanal ma'lumotlari tozalangan
+            return []
+        with self._io_lock:
+            entries, self._unapplied = self._unapplied, []
+            if self._has_new_lines():
+                with self.file_lock(shared=True):
+                    entries.extend(self._follow_journal())
+
+        if entries:
+            with self.lock:
+                for entry in entries:
+                    apply_journal_entry(self.requests, entry)
+        return entries
+
+    def write(self, lines: List[str]):
+        """Jurnal qatorlari paketini bitta yozish bilan diskka chiqarish
+
+        Qulf ostida avval boshqa jarayonlar qo'shgan qatorlar o'qib olinadi,
+        so'ng o'qish o'rni o'z paketimizdan keyinga suriladi - jarayon o'z
+        yozuvlarini qayta o'qimaydi.
+        """
+        data = memoryview("".join(lines).encode("utf-8"))
+        with self._io_lock, self.file_lock():
+            fd = self._open_journal()
+            self._repair_journal(fd)
+            self._unapplied.extend(self._follow_journal())
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+            self._reader.seek(0, os.SEEK_END)
+
+            if os.fstat(fd).st_size >= JOURNAL_COMPACT_BYTES:
+                self._rotate_journal()
+
+    def rotate_journal(self) -> bool:
+        """Jurnalni .old ga aylantirib, siqishni boshlash
+
+        Faqat yozuvchi oqimda (WriteBuffer qulfi ostida) chaqiriladi,
+        shuning uchun paketlar tartibi buzilmaydi.
+        """
+        with self._io_lock, self.file_lock():
+            return self._rotate_journal()
+
+    def _rotate_journal(self) -> bool:
+        if self._compacting or not self._journal_size():
+            return False
+        if self.old_journal_file.exists():
+            # Oldingi siqish boshqa jarayonda davom etmoqda yoki uzilib qolgan
+            self._start_compaction()
+            return False
+        if self._journal is not None:
+            os.close(self._journal)
+            self._journal = None
+        os.replace(self.journal_file, self.old_journal_file)
+        self._start_compaction()
+        return True
+
+    def _start_compaction(self):
+        """Snapshot ni eski jurnal bilan fonda qayta yozish"""
+        with self.lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        self._compaction_thread = threading.Thread(
+            target=self._compact, name=f"compaction-{self.channel_id}", daemon=True
+        )
+        self._compaction_thread.start()
+
+    def _compact(self):
+        # Xotiradagi holatga tegilmaydi: snapshot diskdagi fayllardan yig'iladi,
+        # shuning uchun join so'rovlar siqish davomida bloklanmaydi
+        try:
+            with locked_file(self.compact_lock_file, blocking=False) as acquired:
+                # Band bo'lsa, shu jurnalni boshqa jarayon siqmoqda
+                if not acquired or not self.old_journal_file.exists():
+                    return
+                requests, _ = self._read_snapshot()
+                self._replay_journal(requests, self.old_journal_file, skip_duplicates=True)
+                files = self._write_snapshot_files(requests)
+                # Boshqa jarayonlar snapshot va eski jurnalni bir holatda ko'rishi uchun
+                with self.file_lock():
+                    for tmp_path, file_path in files:
+                        os.replace(tmp_path, file_path)
+                    os.remove(self.old_journal_file)
+        except Exception as e:
+            logger.error(f"Kanal {self.channel_id} jurnalini siqishda xato: {e}")
+        finally:
+            self._compacting = False
+
+    def wait_compaction(self):
+        if self._compacting:
+            self._compaction_thread.join()
+
+    def files(self) -> List[Path]:
+        return [
+            self.binary_snapshot_file, self.snapshot_file, self.journal_file, self.old_journal_file
+        ]
+
+    def close(self):
+        with self._io_lock:
+            self._close_files()
+
+    def _close_files(self):
+        if self._journal is not None:
+            os.close(self._journal)
+            self._journal = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def remove(self):
+        """Kanal so'rovlari fayllarini o'chirish (kanal fayli qoladi)"""
+        self.wait_compaction()
+        with self._io_lock, self.file_lock():
+            self._close_files()
+            for file in self.files():
+                if file.exists():
+                    file.unlink()
+        for file in (self.lock_file, self.compact_lock_file):
+            if file.exists():
+                file.unlink()
+        try:
+            self.directory.rmdir()
+        except OSError:
+            pass
+
+class JsonStorage(BaseStorage):
+    """JSON fayllar: channels/<id>.json (kanal) va channels/<id>/ (so'rovlar)
+
+    Join so'rovlar kanal bo'yicha bo'lingan (ChannelShard): har bir kanal
+    o'z snapshot va jurnaliga ega, holat xotirada ChannelRequests ko'rinishida.
+    Har bir join so'rov jurnalga bitta qator bo'lib qo'shiladi (O(1)),
+    barcha kanallar jurnallari bitta WriteBuffer orqali paketlab yoziladi.
+
+    Bir nechta jarayon bitta papkaga yozishi mumkin (STORAGE_MULTIPROCESS):
+    fon oqimi har FOLLOW_INTERVAL_MS da boshqa jarayonlar jurnallarga qo'shgan
+    qatorlarni (va yangi kanal papkalarini) o'qib, xotiradagi holatga qo'shadi.
+    Bitta jarayonda bu oqim ishga tushmaydi.
+    """
+
+    def __init__(self):
+        self._shards: Optional[Dict[str, ChannelShard]] = None
+        self._buffer: Optional[WriteBuffer] = None
+        self._lock = threading.RLock()
+        self._channels_lock = threading.RLock()
+        self._listener = None
+        self._follower: Optional[threading.Thread] = None
+        self._stop_following = threading.Event()
+        self._channels_dir_version = None
+
+    # --- Kanallar ---
+
+    @staticmethod
+    def get_channel_file(channel_id: str) -> Path:
+        return CHANNELS_DIR / f"{channel_id}.json"
+
+    @contextmanager
+    def _locked_channels(self):
+        """Kanallar indeksi uchun oqimlar va jarayonlar orasidagi qulf"""
+        with self._channels_lock, locked_file(CHANNELS_LOCK_FILE):
+            yield
+
+    @staticmethod
+    def _read_channel_index() -> Dict[str, dict]:
+        if CHANNELS_INDEX_FILE.exists():
+            with open(CHANNELS_INDEX_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        # Indeks hali yo'q (eski o'rnatma) - kanal fayllaridan yig'iladi
+        channels = {}
+        for file in CHANNELS_DIR.glob("*.json"):
+            if file in (CHANNELS_INDEX_FILE, CHANNELS_DELETED_FILE):
+                continue
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            channels[str(data['id'])] = data
+        atomic_write_json(CHANNELS_INDEX_FILE, channels)
+        return channels
+
+    def load_channel_index(self) -> Dict[str, dict]:
+        with self._locked_channels():
+            return self._read_channel_index()
+
+    def channel_index_version(self):
+        try:
+            return CHANNELS_INDEX_FILE.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _read_deleted_channels() -> Dict[str, float]:
+        if not CHANNELS_DELETED_FILE.exists():
+            return {}
+        with open(CHANNELS_DELETED_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_channel(self, channel_id: str, data: dict):
+        with self._locked_channels():
+            channels = self._read_channel_index()
+            channels[channel_id] = data
+            atomic_write_json(self.get_channel_file(channel_id), data)
+            atomic_write_json(CHANNELS_INDEX_FILE, channels)
+            # Qayta qo'shilgan kanal endi o'chirilgan hisoblanmaydi
+            deleted = self._read_deleted_channels()
+            if deleted.pop(channel_id, None) is not None:
+                atomic_write_json(CHANNELS_DELETED_FILE, deleted)
+
+    def delete_channel(self, channel_id: str):
+        with self._locked_channels():
+            channels = self._read_channel_index()
+            channels.pop(channel_id, None)
+            file_path = self.get_channel_file(channel_id)
+            if file_path.exists():
+                file_path.unlink()
+            atomic_write_json(CHANNELS_INDEX_FILE, channels)
+            deleted = self._read_deleted_channels()
+            deleted[channel_id] = time.time()
+            atomic_write_json(CHANNELS_DELETED_FILE, deleted)
+
+    def deleted_channels(self) -> Dict[str, float]:
+        with self._locked_channels():
+            return self._read_deleted_channels()
+
+    def forget_deleted_channels(self, channel_ids: Set[str]):
+        with self._locked_channels():
+            deleted = self._read_deleted_channels()
+            forgotten = [channel_id for channel_id in channel_ids if deleted.pop(channel_id, None)]
+            if forgotten:
+                atomic_write_json(CHANNELS_DELETED_FILE, deleted)
+
+    # --- Join so'rovlar ---
+
+    @staticmethod
+    def _read_legacy_users() -> Dict[str, ChannelRequests]:
+        with open(USERS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data.get("version") == SNAPSHOT_VERSION:
+            return {
+                channel_id: ChannelRequests.from_dict(columns)
+                for channel_id, columns in data["channels"].items()
+            }
+
+        # Eng eski ko'rinish: user_id -> channel_id -> [{"timestamp", "status"}]
+        rows = [
+            (parse_epoch(request["timestamp"]), int(user_id), channel_id, request["status"])
+            for user_id, user_channels in data.items()
+            for channel_id, requests in user_channels.items()
+            for request in requests
+        ]
+        rows.sort()
+        channels: Dict[str, ChannelRequests] = {}
+        for ts, user_id, channel_id, status in rows:
+            if channel_id not in channels:
+                channels[channel_id] = ChannelRequests()
+            channels[channel_id].append(user_id, ts, STATUS_CODES[status])
+        return channels
+
+    @staticmethod
+    def _replay_legacy_journal(channels: Dict[str, ChannelRequests], journal_path: str,
+                               seen: Optional[Dict[str, Set]] = None):
+        """Umumiy users.journal.jsonl qatorlarini kanallarga qo'llash"""
+        if not os.path.exists(journal_path):
+            return
+
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    logger.warning(f"Jurnal oxiridagi chala qator tashlab yuborildi: {journal_path}")
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Jurnaldagi buzilgan qator tashlab yuborildi: {journal_path}")
+                    continue
+
+                if entry.get("op") == "purge":
+                    keep_channels = set(entry["channels"])
+                    for channel_id in list(channels):
+                        if channel_id not in keep_channels:
+                            del channels[channel_id]
+                    for requests in channels.values():
+                        apply_journal_entry(requests, entry)
+                    continue
+
+                channel_id = entry["channel_id"]
+                if channel_id not in channels:
+                    channels[channel_id] = ChannelRequests()
+                channel_seen = None
+                if seen is not None:
+                    if channel_id not in seen:
+                        seen[channel_id] = set(zip(
+                            channels[channel_id].user_ids, channels[channel_id].timestamps
+                        ))
+                    channel_seen = seen[channel_id]
+                apply_journal_entry(channels[channel_id], entry, channel_seen)
+
+    def _migrate_users_file(self):
+        """Eski users.json va uning jurnalini kanallar bo'yicha fayllarga ko'chirish"""
+        if not os.path.exists(USERS_FILE):
+            return
+
+        channels = self._read_legacy_users()
+        self._replay_legacy_journal(channels, f"{USERS_JOURNAL_FILE}.old", seen={})
+        self._replay_legacy_journal(channels, USERS_JOURNAL_FILE)
+        for channel_id, requests in channels.items():
+            ChannelShard(channel_id).write_snapshot(requests)
+
+        # users.json nomi o'zgargach ko'chirish tugagan hisoblanadi,
+        # undan oldin uzilsa keyingi ishga tushishda qaytadan bajariladi
+        os.replace(USERS_FILE, f"{USERS_FILE}.bak")
+        for journal_path in (USERS_JOURNAL_FILE, f"{USERS_JOURNAL_FILE}.old"):
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+
+        logger.info(
+            f"{USERS_FILE} kanallar bo'yicha ko'chirildi: {len(channels)} ta kanal "
+            f"(nusxa: {USERS_FILE}.bak)"
+        )
+
+    def load_requests(self) -> Dict[str, ChannelShard]:
+        with self._lock:
+            if self._shards is None:
+                # Bir vaqtda ishga tushgan jarayonlar ko'chirishni ikki marta bajarmasligi uchun
+                with self._locked_channels():
+                    self._migrate_users_file()
+                self._channels_dir_version = CHANNELS_DIR.stat().st_mtime_ns
+                shards = {}
+                for directory in CHANNELS_DIR.iterdir():
+                    if not directory.is_dir():
+                        continue
+                    shard = ChannelShard(directory.name)
+                    shard.load()
+                    shards[shard.channel_id] = shard
+                self._shards = shards
+                self._buffer = WriteBuffer(self._write_journal, name="requests-journal")
+                if STORAGE_MULTIPROCESS:
+                    self._stop_following.clear()
+                    self._follower = threading.Thread(
+                        target=self._follow_loop, name="requests-follower", daemon=True
+                    )
+                    self._follower.start()
+            return self._shards
+
+    def _get_shard(self, channel_id: str, create: bool = False) -> Optional[ChannelShard]:
+        shards = self.load_requests()
+        shard = shards.get(channel_id)
+        if shard is None and create:
+            shard = self._add_shard(channel_id)
+        return shard
+
+    def _add_shard(self, channel_id: str) -> ChannelShard:
+        """Xotirada yo'q kanal (boshqa jarayon yaratgan bo'lsa, yozuvlari bilan)"""
+        with self._lock:
+            shard = self._shards.get(channel_id)
+            if shard is not None:
+                return shard
+            shard = ChannelShard(channel_id)
+            shard.load()
+            self._shards[channel_id] = shard
+
+        if self._listener is not None:
+            with shard.lock:
+                requests = shard.requests
+                entries = [
+                    {"user_id": user_id, "ts": ts, "status": STATUSES[status]}
+                    for user_id, ts, status in zip(
+                        requests.user_ids, requests.timestamps, requests.statuses
+                    )
+                ]
+            if entries:
+                self._listener(channel_id, entries)
+        return shard
+
+    def set_change_listener(self, listener):
+        self._listener = listener
+
+    def follow(self):
+        """Boshqa jarayonlar yozgan so'rovlar va yangi kanallarni xotiraga olish"""
+        shards = self.load_requests()
+        version = CHANNELS_DIR.stat().st_mtime_ns
+        if version != self._channels_dir_version:
+            self._channels_dir_version = version
+            for directory in CHANNELS_DIR.iterdir():
+                if directory.is_dir() and directory.name not in shards:
+                    self._add_shard(directory.name)
+
+        for channel_id, shard in list(shards.items()):
+            entries = shard.follow()
+            if entries and self._listener is not None:
+                self._listener(channel_id, entries)
+
+    def _follow_loop(self):
+        while not self._stop_following.wait(FOLLOW_INTERVAL_MS / 1000):
+            try:
+                self.follow()
+            except Exception as e:
+                logger.error(f"Boshqa jarayonlar yozuvlarini o'qishda xato: {e}")
+
+    def _write_journal(self, items: List[Tuple[ChannelShard, str]]):
+        """Paketdagi qatorlarni kanallar bo'yicha guruhlab, jurnallarga yozish"""
+        batches: Dict[ChannelShard, List[str]] = {}
+        for shard, line in items:
+            batches.setdefault(shard, []).append(line)
+        for shard, lines in batches.items():
+            if self._shards.get(shard.channel_id) is not shard:
+                # Kanal ma'lumotlari tozalash paytida o'chirilgan
+                logger.warning(f"O'chirilgan kanal {shard.channel_id} uchun yozuvlar tashlab yuborildi")
+                continue
+            shard.write(lines)
+
+    def _drop_deleted_shard(self, channel_id: str, deleted_at: float) -> Optional[int]:
+        """O'chirilgan kanal so'rovlarini o'chirish (buferdagilar yozilgandan keyin)
+
+        Kanal qayta qo'shilgan yoki o'chirilgandan keyin so'rov kelgan bo'lsa
+        None - kanal ma'lumotlari saqlanadi.
+        """
+        if channel_id not in self.deleted_channels():
+            return None
+        shard = self._shards.get(channel_id)
+        if shard is None:
+            return 0
+        with shard.lock:
+            requests = shard.requests
+            if len(requests) and requests.timestamps[-1] >= int(deleted_at):
+                return None
+            with self._lock:
+                self._shards.pop(channel_id, None)
+            count = len(requests)
+        shard.remove()
+        return count
+
+    def _compact_shard(self, shard: ChannelShard):
+        # Oldingi siqish tugamagan bo'lsa, avval uni kutamiz
+        shard.wait_compaction()
+        if self._buffer.flush(then=shard.rotate_journal):
+            shard.wait_compaction()
+
+    def compact_now(self):
+        """Barcha kanallar jurnallarini darhol siqish va tugashini kutish"""
+        for shard in list(self.load_requests().values()):
+            self._compact_shard(shard)
+
+    def add_join_request(self, user_id: int, channel_id: str, timestamp: datetime):
+        ts = int(timestamp.timestamp())
+        entry = {"user_id": user_id, "ts": ts}
+
+        shard = self._get_shard(channel_id, create=True)
+        with shard.lock:
+            shard.requests.append(user_id, ts)
+            self._buffer.add((shard, json.dumps(entry, ensure_ascii=False) + "\n"))
+
+    def set_statuses(self, channel_id: str, statuses: Dict[int, str]):
+        entry = {
+            "op": "status",
+            "statuses": {str(user_id): status for user_id, status in statuses.items()}
+        }
+
+        shard = self._get_shard(channel_id)
+        if shard is None:
+            return
+        with shard.lock:
+            apply_journal_entry(shard.requests, entry)
+            self._buffer.add((shard, json.dumps(entry, ensure_ascii=False) + "\n"))
+
+    def purge(self, before: float, deleted: Dict[str, float]) -> Tuple[int, List[str]]:
+        entry = {"op": "purge", "before": int(before)}
+        removed = 0
+        purged = []
+        dropped = []
+
+        for channel_id, shard in list(self.load_requests().items()):
+            if channel_id in deleted:
+                # Buferdagi yozuvlar jurnalga tushgandan keyin o'chiriladi
+                count = self._buffer.flush(then=functools.partial(
+                    self._drop_deleted_shard, channel_id, deleted[channel_id]
+                ))
+                if count is not None:
+                    removed += count
+                    dropped.append(channel_id)
+                    continue
+
+            with shard.lock:
+                count = shard.requests.purge(int(before))
+                if count:
+                    self._buffer.add((shard, json.dumps(entry) + "\n"))
+                    purged.append(shard)
+            removed += count
+
+        # O'chirilgan yozuvlar snapshot lardan ham chiqib ketishi uchun
+        for shard in purged:
+            self._compact_shard(shard)
+        return removed, dropped
+
+    def storage_size(self) -> int:
+        return sum(
+            file.stat().st_size
+            for shard in list(self.load_requests().values())
+            for file in shard.files() if file.exists()
+        )
+
+    def flush(self):
+        if self._buffer is not None:
+            self._buffer.flush()
+
+    def get_join_requests(self, channel_id: str,
+                          time_range: Optional[timedelta] = None) -> List[int]:
+        since = int((datetime.now() - time_range).timestamp()) if time_range else None
+        shard = self._get_shard(channel_id)
+        if shard is None:
+            return []
+        with shard.lock:
+            return shard.requests.pending_users(since)
+
+    def iter_join_requests(self) -> Iterator[Tuple[int, str, datetime, str]]:
+        for channel_id, shard in list(self.load_requests().items()):
+            with shard.lock:
+                requests = shard.requests
+                for user_id, ts, status in zip(
+                    requests.user_ids, requests.timestamps, requests.statuses
+                ):
+                    yield user_id, channel_id, datetime.fromtimestamp(ts), STATUSES[status]
+
+    def iter_channel_requests(self, channel_id: str,
+                              chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[Tuple[int, int, str]]]:
+        shard = self._get_shard(channel_id)
+        if shard is None:
+            return
+        offset = 0
+        while True:
+            # Qulf faqat bo'lak nusxasi olinguncha - join so'rovlar eksportni kutmaydi
+            with shard.lock:
+                requests = shard.requests
+                end = offset + chunk_rows
+                user_ids = requests.user_ids[offset:end]
+                timestamps = requests.timestamps[offset:end]
+                statuses = requests.statuses[offset:end]
+            if not user_ids:
+                return
+            yield [
+                (user_id, ts, STATUSES[status])
+                for user_id, ts, status in zip(user_ids, timestamps, statuses)
+            ]
+            offset = end
+
+    def iter_pending(self) -> Iterator[Tuple[str, int, float]]:
+        pending = []
+        for channel_id, shard in list(self.load_requests().items()):
+            with shard.lock:
+                timestamps = shard.requests.timestamps
+                pending.extend(
+                    (timestamps[row], channel_id, user_id)
+                    for user_id, row in shard.requests.pending.items()
+                )
+        pending.sort()
+        for ts, channel_id, user_id in pending:
+            yield channel_id, user_id, float(ts)
+
+    def iter_hourly_joins(self, since: float) -> Iterator[Tuple[str, int, int]]:
+        for channel_id, shard in list(self.load_requests().items()):
+            counts: Dict[int, int] = {}
+            with shard.lock:
+                for ts in shard.requests.timestamps_since(int(since)):
+                    hour = ts // 3600
+                    counts[hour] = counts.get(hour, 0) + 1
+            for hour, count in counts.items():
+                yield channel_id, hour, count
+
+    def is_empty(self) -> bool:
+        return not self.load_requests() and not self.load_channel_index()
+
+    def close(self):
+        if self._follower is not None:
+            self._stop_following.set()
+            self._follower.join()
+            self._follower = None
+        with self._lock:
+            if self._buffer is not None:
+                self._buffer.close()
+                self._buffer = None
+            if self._shards is not None:
+                for shard in self._shards.values():
+                    shard.wait_compaction()
+                    shard.close()
+                self._shards = None
+
+class SqliteStorage(BaseStorage):
+    """SQLite (WAL) - katta o'rnatmalar uchun, so'rovlar indeks orqali
+
+    Bitta jarayon uchun: kutilayotganlar indeksi (PendingIndex) boshqa
+    jarayonlar qo'shgan so'rovlarni ko'rmaydi, shuning uchun baza <db>.lock
+    qulfi bilan ochiladi va ikkinchi jarayon xato bilan to'xtaydi. Bir nechta
+    worker uchun STORAGE_BACKEND=json.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS channels (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS join_requests (
+            id INTEGER PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            status TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_join_requests_channel_status_ts
+            ON join_requests (channel_id, status, ts);
+        CREATE TABLE IF NOT EXISTS deleted_channels (
+            id TEXT PRIMARY KEY,
+            deleted_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_file: str = SQLITE_FILE):
+        self._lock = threading.RLock()
+        self._db_file = db_file
+        self._process_lock = ExitStack()
+        if not self._process_lock.enter_context(locked_file(f"{db_file}.lock", blocking=False)):
+            self._process_lock.close()
+            raise RuntimeError(
+                f"{db_file} boshqa jarayonda ochilgan: SQLite bitta jarayon uchun, "
+                f"bir nechta worker uchun STORAGE_BACKEND=json"
+            )
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+        self._buffer = WriteBuffer(self._insert_join_requests, name="sqlite-writer")
+
+    # --- Kanallar ---
+
+    def save_channel(self, channel_id: str, data: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO channels (id, data) VALUES (?, ?)",
+                (channel_id, json.dumps(data, ensure_ascii=False))
+            )
+            self._conn.execute("DELETE FROM deleted_channels WHERE id = ?", (channel_id,))
+
+    def load_channel_index(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM channels").fetchall()
+        return {channel_id: json.loads(data) for channel_id, data in rows}
+
+    def channel_index_version(self):
+        # Boshqa ulanishlar (jarayonlar) yozganda o'zgaradi
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def delete_channel(self, channel_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM channels WHERE id = ?", (channel_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO deleted_channels (id, deleted_at) VALUES (?, ?)",
+                (channel_id, time.time())
+            )
+
+    def deleted_channels(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, deleted_at FROM deleted_channels").fetchall())
+
+    def forget_deleted_channels(self, channel_ids: Set[str]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM deleted_channels WHERE id = ?", [(channel_id,) for channel_id in channel_ids]
+            )
+
+    # --- Join so'rovlar ---
+
+    def add_join_request(self, user_id: int, channel_id: str, timestamp: datetime):
+        self._buffer.add((channel_id, user_id, timestamp.timestamp()))
+
+    def _insert_join_requests(self, rows: List[Tuple[str, int, float]]):
+        """Buferdagi so'rovlarni bitta tranzaksiyada yozish"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO join_requests (channel_id, user_id, ts, status) "
+                "VALUES (?, ?, ?, 'pending')",
+                rows
+            )
+
+    def flush(self):
+        self._buffer.flush()
+
+    def set_statuses(self, channel_id: str, statuses: Dict[int, str]):
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE join_requests SET status = ? "
+                "WHERE channel_id = ? AND user_id = ? AND status = 'pending'",
+                ((status, channel_id, user_id) for user_id, status in statuses.items())
+            )
+
+    @staticmethod
+    def _since(time_range: Optional[timedelta]) -> float:
+        if time_range is None:
+            return float("-inf")
+        return (datetime.now() - time_range).timestamp()
+
+    def get_join_requests(self, channel_id: str,
+                          time_range: Optional[timedelta] = None) -> List[int]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM join_requests "
+                "WHERE channel_id = ? AND status = 'pending' AND ts >= ? "
+                "ORDER BY ts",
+                (channel_id, self._since(time_range))
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count_join_requests(self, channel_id: str,
+                            time_range: Optional[timedelta] = None) -> int:
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM join_requests "
+                "WHERE channel_id = ? AND status = 'pending' AND ts >= ?",
+                (channel_id, self._since(time_range))
+            ).fetchone()
+        return row[0]
+
+    def purge(self, before: float, deleted: Dict[str, float]) -> Tuple[int, List[str]]:
+        self.flush()
+        dropped = []
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute(
+                    "DELETE FROM join_requests WHERE status != 'pending' AND ts < ?",
+                    (before,)
+                ).rowcount
+                for channel_id, deleted_at in deleted.items():
+                    # Qayta qo'shilgan yoki o'chirilgandan keyin so'rov kelgan kanal qoladi
+                    if self._conn.execute(
+                        "SELECT 1 FROM deleted_channels WHERE id = ?", (channel_id,)
+                    ).fetchone() is None:
+                        continue
+                    if self._conn.execute(
+                        "SELECT 1 FROM join_requests WHERE channel_id = ? AND ts >= ? LIMIT 1",
+                        (channel_id, deleted_at)
+                    ).fetchone() is not None:
+                        continue
+                    removed += self._conn.execute(
+                        "DELETE FROM join_requests WHERE channel_id = ?", (channel_id,)
+                    ).rowcount
+                    dropped.append(channel_id)
+
+        if removed:
+            # VACUUM alohida ulanishda, umumiy qulfsiz: shu vaqtda yozuvchilar
+            # SQLite darajasida kutadi (busy timeout), event loop va buferlar emas
+            conn = sqlite3.connect(self._db_file, timeout=SQLITE_BUSY_TIMEOUT)
+            try:
+                # VACUUM WAL orqali yoziladi, bo'shagan joy checkpoint dan keyin qaytadi
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+        return removed, dropped
+
+    def storage_size(self) -> int:
+        files = [self._db_file, f"{self._db_file}-wal"]
+        return sum(os.path.getsize(file) for file in files if os.path.exists(file))
+
+    def iter_join_requests(self) -> Iterator[Tuple[int, str, datetime, str]]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, channel_id, ts, status FROM join_requests ORDER BY id"
+            ).fetchall()
+        for user_id, channel_id, ts, status in rows:
+            yield user_id, channel_id, datetime.fromtimestamp(ts), status
+
+    def iter_channel_requests(self, channel_id: str,
+                              chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[Tuple[int, int, str]]]:
+        self.flush()
+        # Alohida o'quvchi ulanish (WAL): eksport davomida yozuvlar bloklanmaydi
+        conn = sqlite3.connect(self._db_file)
+        try:
+            cursor = conn.execute(
+                "SELECT user_id, CAST(ts AS INTEGER), status FROM join_requests "
+                "WHERE channel_id = ? ORDER BY id",
+                (channel_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+    def iter_pending(self) -> Iterator[Tuple[str, int, float]]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT channel_id, user_id, MIN(ts) AS first_ts FROM join_requests "
+                "WHERE status = 'pending' GROUP BY channel_id, user_id ORDER BY first_ts"
+            ).fetchall()
+        yield from rows
+
+    def iter_hourly_joins(self, since: float) -> Iterator[Tuple[str, int, int]]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT channel_id, CAST(ts / 3600 AS INTEGER) AS hour, COUNT(*) "
+                "FROM join_requests WHERE ts >= ? GROUP BY channel_id, hour",
+                (since,)
+            ).fetchall()
+        yield from rows
+
+    def is_empty(self) -> bool:
+        self.flush()
+        with self._lock:
+            channels = self._conn.execute("SELECT 1 FROM channels LIMIT 1").fetchone()
+            requests = self._conn.execute("SELECT 1 FROM join_requests LIMIT 1").fetchone()
+        return channels is None and requests is None
+
+    def close(self):
+        self._buffer.close()
+        with self._lock:
+            self._conn.close()
+        self._process_lock.close()
+
+def migrate_json_to_sqlite(source: JsonStorage, target: SqliteStorage) -> Tuple[int, int]:
+    """JSON fayllardagi ma'lumotlarni SQLite ga ko'chirish (bir martalik)"""
+    channels = source.load_channel_index()
+    for channel_id, channel in channels.items():
+        target.save_channel(channel_id, channel)
+
+    with target._lock, target._conn:
+        cursor = target._conn.executemany(
+            "INSERT INTO join_requests (channel_id, user_id, ts, status) VALUES (?, ?, ?, ?)",
+            (
+                (channel_id, user_id, timestamp.timestamp(), status)
+                for user_id, channel_id, timestamp, status in source.iter_join_requests()
+            )
+        )
+        requests_count = cursor.rowcount
+        target._conn.executemany(
+            "INSERT OR REPLACE INTO deleted_channels (id, deleted_at) VALUES (?, ?)",
+            source.deleted_channels().items()
+        )
+
+    logger.info(f"SQLite ga ko'chirildi: {len(channels)} ta kanal, {requests_count} ta so'rov")
+    return len(channels), requests_count
+
+class HourlyCounter:
+    """Soatlik hisoblagich - oxirgi STATS_HOURS soat uchun halqa bufer"""
+
+    def __init__(self, size: int = STATS_HOURS):
+        self._size = size
+        self._counts = array('l', [0]) * size
+        # Har bir katak qaysi soatga tegishli (eskirgan kataklar nol hisoblanadi)
+        self._hours = array('q', [-1]) * size
+
+    def add(self, hour: int, delta: int = 1):
+        i = hour % self._size
+        if self._hours[i] != hour:
+            if hour < self._hours[i]:
+                # Oynadan chiqib ketgan soat
+                return
+            self._hours[i] = hour
+            self._counts[i] = 0
+        self._counts[i] += delta
+
+    def series(self, current_hour: int, hours: int) -> List[int]:
+        """Oxirgi hours soat uchun qiymatlar (eskisidan yangisiga)"""
+        result = []
+        for hour in range(current_hour - hours + 1, current_hour + 1):
+            i = hour % self._size
+            result.append(self._counts[i] if self._hours[i] == hour else 0)
+        return result
+
+    def total(self, current_hour: int, hours: int) -> int:
+        return max(0, sum(self.series(current_hour, hours)))
+
+class ChannelStats:
+    """Kanal statistikasi: kelgan so'rovlar va kutilayotganlar (soatlik)"""
+
+    def __init__(self):
+        self.joins = HourlyCounter()
+        self.pending = HourlyCounter()
+
+class PendingOrder:
+    """Kanal kutilayotganlari qo'shilish tartibida, sahifalash uchun
+
+    users - faqat oxiriga qo'shiladigan ro'yxat; chiqarilgan foydalanuvchi
+    o'rni bo'sh qoladi (slots da yo'q) va ro'yxat vaqti-vaqti bilan qayta
+    quriladi. Kursor - (generation, ro'yxatdagi o'rin): sahifa qidiruvsiz,
+    shu o'rindan boshlab o'qiladi.
+    """
+
+    __slots__ = ("users", "slots", "generation")
+
+    def __init__(self):
+        self.users: List[int] = []
+        self.slots: Dict[int, int] = {}
+        self.generation = 0
+
+    def add(self, user_id: int):
+        self.slots[user_id] = len(self.users)
+        self.users.append(user_id)
+
+    def remove(self, user_id: int):
+        self.slots.pop(user_id, None)
+
+    def compact_if_sparse(self):
+        dead = len(self.users) - len(self.slots)
+        if dead > max(PENDING_ORDER_COMPACT_MIN, len(self.slots)):
+            # slots qo'shilish tartibida - o'rinlar ham shu tartibda o'sadi
+            self.users = list(self.slots)
+            self.slots = {user_id: row for row, user_id in enumerate(self.users)}
+            self.generation += 1
+
+    def is_live(self, row: int) -> bool:
+        return self.slots.get(self.users[row]) == row
+
+class PendingIndex:
+    """Kanal bo'yicha kutilayotgan foydalanuvchilar indeksi (xotirada)
+
+    channel_id -> {user_id: birinchi so'rov vaqti}, qo'shilish tartibida.
+    Bir foydalanuvchining takroriy so'rovlari bitta yozuvga birlashadi.
+    Yonida har bir kanal uchun soatlik hisoblagichlar va sahifalash
+    tartibi (PendingOrder) yuritiladi.
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, Dict[int, float]] = {}
+        self._stats: Dict[str, ChannelStats] = {}
+        self._orders: Dict[str, PendingOrder] = {}
+        self._lock = threading.Lock()
+
+    def _channel_stats(self, channel_id: str) -> ChannelStats:
+        stats = self._stats.get(channel_id)
+        if stats is None:
+            stats = self._stats[channel_id] = ChannelStats()
+        return stats
+
+    def add(self, channel_id: str, user_id: int, ts: float):
+        with self._lock:
+            pending = self._channels.setdefault(channel_id, {})
+            if user_id not in pending:
+                pending[user_id] = ts
+                self._channel_stats(channel_id).pending.add(int(ts // 3600))
+                order = self._orders.get(channel_id)
+                if order is None:
+                    order = self._orders[channel_id] = PendingOrder()
+                order.add(user_id)
+
+    def record_join(self, channel_id: str, ts: float, count: int = 1):
+        with self._lock:
+            self._channel_stats(channel_id).joins.add(int(ts // 3600), count)
+
+    def remove(self, channel_id: str, user_ids):
+        with self._lock:
+            pending = self._channels.get(channel_id)
+            if pending is None:
+                return
+            stats = self._channel_stats(channel_id)
+            order = self._orders[channel_id]
+            for user_id in user_ids:
+                ts = pending.pop(user_id, None)
+                if ts is not None:
+                    stats.pending.add(int(ts // 3600), -1)
+                    order.remove(user_id)
+            order.compact_if_sparse()
+
+    def drop_channels(self, channel_ids):
+        """Ma'lumotlari o'chirilgan kanallarni indeksdan chiqarish"""
+        with self._lock:
+            for channel_id in channel_ids:
+                self._channels.pop(channel_id, None)
+                self._stats.pop(channel_id, None)
+                self._orders.pop(channel_id, None)
+
+    def get(self, channel_id: str, since: Optional[float] = None,
+            limit: Optional[int] = None) -> List[int]:
+        with self._lock:
+            pending = self._channels.get(channel_id, {})
+            if since is None:
+                return list(islice(pending, limit))
+            matching = (user_id for user_id, ts in pending.items() if ts >= since)
+            return list(islice(matching, limit))
+
+    def get_older(self, channel_id: str, before: float) -> List[int]:
+        """before dan oldin kelgan kutilayotgan foydalanuvchilar"""
+        with self._lock:
+            pending = self._channels.get(channel_id, {})
+            return [user_id for user_id, ts in pending.items() if ts < before]
+
+    def page(self, channel_id: str, cursor: Optional[Tuple[int, int]] = None,
+             backward: bool = False, limit: int = 20):
+        """Kursordan keyingi (backward - oldingi) limit ta kutilayotgan foydalanuvchi
+
+        (qatorlar [(o'rin, user_id, vaqt)], generation, oldingisi bormi, keyingisi bormi).
+        cursor - (generation, o'rin): oldinga - oxirgi qator, orqaga - birinchi qator
+        o'rni; tartib qayta qurilgan bo'lsa birinchi sahifa.
+        Faqat sahifa atrofidagi o'rinlar ko'riladi - kanal hajmiga bog'liq emas.
+        """
+        with self._lock:
+            pending = self._channels.get(channel_id, {})
+            order = self._orders.get(channel_id) or PendingOrder()
+            if cursor is None or cursor[0] != order.generation:
+                start, backward = 0, False
+            else:
+                start = cursor[1] if backward else cursor[1] + 1
+
+            def live_rows(row: int, step: int):
+                while 0 <= row < len(order.users):
+                    if order.is_live(row):
+                        yield row
+                    row += step
+
+            rows = []
+            if backward:
+                rows = list(islice(live_rows(start - 1, -1), limit + 1))
+                has_prev = len(rows) > limit
+                rows = rows[:limit][::-1]
+                has_next = next(live_rows(start, 1), None) is not None
+            if not rows:
+                rows = list(islice(live_rows(start, 1), limit + 1))
+                if not rows and start:
+                    # Kursordan keyin hech kim qolmagan - birinchi sahifa
+                    rows = list(islice(live_rows(0, 1), limit + 1))
+                has_next = len(rows) > limit
+                rows = rows[:limit]
+                has_prev = bool(rows) and next(live_rows(rows[0] - 1, -1), None) is not None
+
+            items = [(row, order.users[row], pending[order.users[row]]) for row in rows]
+            return items, order.generation, has_prev, has_next
+
+    def contains(self, channel_id: str, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._channels.get(channel_id, ())
+
+    def count(self, channel_id: str) -> int:
+        with self._lock:
+            return len(self._channels.get(channel_id, {}))
+
+    def count_recent(self, channel_id: str, hours: int) -> int:
+        """Oxirgi hours soatda kelgan kutilayotgan foydalanuvchilar, O(hours)"""
+        with self._lock:
+            stats = self._stats.get(channel_id)
+            if stats is None:
+                return 0
+            return stats.pending.total(int(datetime.now().timestamp() // 3600), hours)
+
+    def join_histogram(self, channel_id: str, hours: int = STATS_HOURS) -> List[int]:
+        """Soatlik kelgan so'rovlar soni (eskisidan yangisiga)"""
+        with self._lock:
+            stats = self._stats.get(channel_id)
+            if stats is None:
+                return [0] * hours
+            return stats.joins.series(int(datetime.now().timestamp() // 3600), hours)
+
+class ChannelRegistry:
+    """Kanallar ro'yxati xotirada
+
+    Bir marta yuklanadi; CHANNEL_CACHE_TTL o'tgach faqat indeks belgisi
+    (fayl mtime / data_version) tekshiriladi va o'zgargan bo'lsa qayta yuklanadi.
+    Yonida nom bo'yicha saralangan (nom, id) ro'yxati - sahifalar bisect bilan olinadi.
+    """
+
+    def __init__(self, storage: BaseStorage, ttl: float = CHANNEL_CACHE_TTL):
+        self._storage = storage
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        self._version = self._storage.channel_index_version()
+        self._channels = self._storage.load_channel_index()
+        self._order = sorted(
+            self._sort_key(channel_id, data) for channel_id, data in self._channels.items()
+        )
+        self._checked = time.monotonic()
+
+    @staticmethod
+    def _sort_key(channel_id: str, data: dict) -> Tuple[str, str]:
+        return str(data.get('title') or "").casefold(), channel_id
+
+    def _forget(self, channel_id: str):
+        data = self._channels.pop(channel_id, None)
+        if data is not None:
+            key = self._sort_key(channel_id, data)
+            row = bisect_left(self._order, key)
+            if row < len(self._order) and self._order[row] == key:
+                del self._order[row]
+
+    def _refresh(self):
+        if time.monotonic() - self._checked < self._ttl:
+            return
+        if self._storage.channel_index_version() != self._version:
+            self._load()
+        else:
+            self._checked = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._load()
+
+    def exists(self, channel_id: str) -> bool:
+        """Diskka murojaatsiz tekshirish (join so'rovlar oqimi uchun)
+
+        Topilmasa, kanal boshqa jarayonda qo'shilgan bo'lishi mumkin -
+        CHANNEL_CACHE_TTL o'tgan bo'lsa indeks belgisi tekshiriladi.
+        """
+        if channel_id in self._channels:
+            return True
+        with self._lock:
+            self._refresh()
+            return channel_id in self._channels
+
+    def get(self, channel_id: str) -> Optional[dict]:
+        with self._lock:
+            self._refresh()
+            data = self._channels.get(channel_id)
+            return dict(data) if data is not None else None
+
+    def all(self) -> List[dict]:
+        with self._lock:
+            self._refresh()
+            return [dict(data) for data in self._channels.values()]
+
+    def page(self, cursor: Optional[str] = None, backward: bool = False,
+             limit: int = 10) -> Tuple[List[dict], int, int]:
+        """Nom bo'yicha saralangan kanallar sahifasi: (kanallar, boshlanish o'rni, jami)
+
+        cursor - oldinga: sahifaning oxirgi, orqaga: birinchi kanali ID si.
+        Kursor kanali o'chirilgan bo'lsa birinchi sahifa qaytadi.
+        """
+        with self._lock:
+            self._refresh()
+            data = self._channels.get(cursor) if cursor is not None else None
+            if data is None:
+                start = 0
+            elif backward:
+                start = max(0, bisect_left(self._order, self._sort_key(cursor, data)) - limit)
+            else:
+                start = bisect_right(self._order, self._sort_key(cursor, data))
+            keys = self._order[start:start + limit]
+            return [dict(self._channels[channel_id]) for _, channel_id in keys], start, len(self._order)
+
+    def save(self, channel_id: str, data: dict):
+        with self._lock:
+            self._storage.save_channel(channel_id, data)
+            self._forget(channel_id)
+            self._channels[channel_id] = dict(data)
+            insort(self._order, self._sort_key(channel_id, data))
+            self._version = self._storage.channel_index_version()
+
+    def delete(self, channel_id: str):
+        with self._lock:
+            self._storage.delete_channel(channel_id)
+            self._forget(channel_id)
+            self._version = self._storage.channel_index_version()
+
+_storage: Optional[BaseStorage] = None
+_pending_index: Optional[PendingIndex] = None
+_channel_registry: Optional[ChannelRegistry] = None
+
+def get_storage() -> BaseStorage:
+    """Konfiguratsiyadagi saqlash turini qaytarish (birinchi chaqiruvda ochiladi)"""
+    global _storage, _pending_index, _channel_registry
+    if _storage is None:
+        if STORAGE_BACKEND == "sqlite":
+            storage = SqliteStorage()
+            # Birinchi ishga tushishda mavjud JSON ma'lumotlar ko'chiriladi
+            if storage.is_empty():
+                source = JsonStorage()
+                if not source.is_empty():
+                    migrate_json_to_sqlite(source, storage)
+                source.close()
+            _storage = storage
+        elif STORAGE_BACKEND == "json":
+            storage = JsonStorage()
+            storage.load_requests()
+            _storage = storage
+        else:
+            raise ValueError(f"Noma'lum STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+        _pending_index = PendingIndex()
+        _storage.set_change_listener(_apply_remote_changes)
+        for channel_id, user_id, ts in _storage.iter_pending():
+            _pending_index.add(channel_id, user_id, ts)
+        since = datetime.now().timestamp() - STATS_HOURS * 3600
+        for channel_id, hour, count in _storage.iter_hourly_joins(since):
+            _pending_index.record_join(channel_id, hour * 3600, count)
+
+        _channel_registry = ChannelRegistry(_storage)
+    return _storage
+
+def _apply_remote_changes(channel_id: str, entries: List[dict]):
+    """Boshqa jarayonlar yozgan jurnal qatorlarini indeksga qo'llash"""
+    index = _pending_index
+    if index is None:
+        return
+    for entry in entries:
+        op = entry.get("op")
+        if op == "status":
+            index.remove(channel_id, [
+                int(user_id) for user_id, status in entry["statuses"].items() if status != "pending"
+            ])
+        elif op is None:
+            ts = parse_epoch(entry.get("ts", entry.get("timestamp")))
+            if entry.get("status", "pending") == "pending":
+                index.add(channel_id, int(entry["user_id"]), ts)
+            index.record_join(channel_id, ts)
+
+def close_storage():
+    """Buferlarni diskka yozib, saqlash qatlamini yopish"""
+    global _storage, _pending_index, _channel_registry
+    if _storage is not None:
+        _storage.close()
+        _storage = None
+        _pending_index = None
+        _channel_registry = None
+
+def get_pending_index() -> PendingIndex:
+    get_storage()
+    return _pending_index
+
+def get_channel_registry() -> ChannelRegistry:
+    get_storage()
+    return _channel_registry
+
+_io_executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+# lock_key -> [qulf, uni kutayotgan/ushlab turganlar soni]; bo'shagan kalit o'chiriladi
+_io_locks: Dict[str, list] = {}
+
+def _timed_call(func, args):
+    with Metrics.timer("storage_seconds", op=getattr(func, "__name__", "call")):
+        return func(*args)
+
+async def run_io(func, *args, lock_key: Optional[str] = None):
+    """Bloklovchi saqlash amalini alohida executor da bajarish
+
+    lock_key berilsa, bir xil faylga yozuvchilar navbat bilan bajariladi.
+    Qulf oxirgi foydalanuvchi chiqqach o'chiriladi, shuning uchun ko'p
+    kalitlar (kanallar, eksportlar) lug'atni cheksiz o'stirmaydi.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_timed_call, func, args)
+    if lock_key is None:
+        return await loop.run_in_executor(_io_executor, call)
+    entry = _io_locks.setdefault(lock_key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            return await loop.run_in_executor(_io_executor, call)
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _io_locks[lock_key]
+
+class ChannelManager:
+    """Kanal ma'lumotlarini boshqarish
+
+    O'qish metodlari xotiradagi reyestrdan ishlaydi; *_async metodlar
+    diskka murojaatni event loop dan tashqarida bajaradi.
+    """
+
+    @staticmethod
+    def save_channel_data(channel_id: str, data: dict):
+        get_channel_registry().save(channel_id, data)
+
+    @staticmethod
+    def load_channel_data(channel_id: str) -> Optional[dict]:
+        return get_channel_registry().get(channel_id)
+
+    @staticmethod
+    def get_all_channels() -> List[dict]:
+        return get_channel_registry().all()
+
+    @staticmethod
+    def get_channels_page(cursor: Optional[str] = None, backward: bool = False,
+                          limit: int = 10) -> Tuple[List[dict], int, int]:
+        """(kanallar, boshlanish o'rni, jami) - faqat sahifadagi kanallar nusxalanadi"""
+        return get_channel_registry().page(cursor, backward, limit)
+
+    @staticmethod
+    def channel_exists(channel_id: str) -> bool:
+        return get_channel_registry().exists(channel_id)
+
+    @staticmethod
+    def delete_channel(channel_id: str):
+        get_channel_registry().delete(channel_id)
+
+    @staticmethod
+    async def save_channel_data_async(channel_id: str, data: dict):
+        await run_io(
+            ChannelManager.save_channel_data, channel_id, data, lock_key=f"channel:{channel_id}"
+        )
+
+    @staticmethod
+    async def load_channel_data_async(channel_id: str) -> Optional[dict]:
+        return await run_io(ChannelManager.load_channel_data, channel_id)
+
+    @staticmethod
+    async def get_all_channels_async() -> List[dict]:
+        return await run_io(ChannelManager.get_all_channels)
+
+    @staticmethod
+    async def get_channels_page_async(cursor: Optional[str] = None, backward: bool = False,
+                                      limit: int = 10) -> Tuple[List[dict], int, int]:
+        return await run_io(ChannelManager.get_channels_page, cursor, backward, limit)
+
+    @staticmethod
+    async def delete_channel_async(channel_id: str):
+        await run_io(ChannelManager.delete_channel, channel_id, lock_key=f"channel:{channel_id}")
+
+class UserManager:
+    """Foydalanuvchi ma'lumotlarini boshqarish
+
+    O'qish metodlari xotiradagi indeksdan ishlaydi va diskka tegmaydi;
+    yozuvchi metodlarning *_async variantlari executor da kanal bo'yicha navbat
+    bilan bajariladi - har xil kanallar yozuvlari bir-birini kutmaydi.
+    """
+
+    @staticmethod
+    def add_join_request(user_id: int, channel_id: str):
+        timestamp = datetime.now()
+        get_storage().add_join_request(user_id, channel_id, timestamp)
+        index = get_pending_index()
+        index.add(channel_id, user_id, timestamp.timestamp())
+        index.record_join(channel_id, timestamp.timestamp())
+
+    @staticmethod
+    def get_join_requests(channel_id: str, time_range: Optional[timedelta] = None,
+                          limit: Optional[int] = None) -> List[int]:
+        """Kutilayotgan foydalanuvchilar (takrorlarsiz, birinchi so'rov tartibida)"""
+        since = (datetime.now() - time_range).timestamp() if time_range else None
+        return get_pending_index().get(channel_id, since, limit)
+
+    @staticmethod
+    def get_stale_join_requests(channel_id: str, age: timedelta) -> List[int]:
+        """age dan oldin kelgan va hali kutilayotgan foydalanuvchilar"""
+        before = (datetime.now() - age).timestamp()
+        return get_pending_index().get_older(channel_id, before)
+
+    @staticmethod
+    def get_join_requests_page(channel_id: str, cursor: Optional[Tuple[int, int]] = None,
+                               backward: bool = False, limit: int = 20):
+        """Kutilayotganlar sahifasi: ([(o'rin, user_id, vaqt)], generation, oldingi, keyingi)"""
+        return get_pending_index().page(channel_id, cursor, backward, limit)
+
+    @staticmethod
+    def is_pending(channel_id: str, user_id: int) -> bool:
+        return get_pending_index().contains(channel_id, user_id)
+
+    @staticmethod
+    def count_join_requests(channel_id: str, time_range: Optional[timedelta] = None) -> int:
+        if time_range is None:
+            return get_pending_index().count(channel_id)
+        # Soatlik hisoblagichlardan (soat aniqligida)
+        hours = max(1, int(time_range.total_seconds() // 3600))
+        return get_pending_index().count_recent(channel_id, hours)
+
+    @staticmethod
+    def get_join_histogram(channel_id: str, hours: int = STATS_HOURS) -> List[int]:
+        """Oxirgi hours soat uchun soatlik kelgan so'rovlar soni"""
+        return get_pending_index().join_histogram(channel_id, hours)
+
+    @staticmethod
+    def set_statuses(channel_id: str, statuses: Dict[int, str]):
+        """Qayta ishlangan so'rovlar natijasini bitta paketda saqlash
+
+        "pending" dan boshqa statusdagi foydalanuvchilar kutilayotganlardan chiqadi.
+        """
+        if not statuses:
+            return
+        get_storage().set_statuses(channel_id, statuses)
+        get_pending_index().remove(
+            channel_id, [user_id for user_id, status in statuses.items() if status != "pending"]
+        )
+
+    @staticmethod
+    def purge_history(retention_days: int) -> Tuple[int, int]:
+        """retention_days dan eski qayta ishlangan so'rovlar va o'chirilgan
+        kanallar ma'lumotlarini tozalash; (yozuvlar, bo'shagan baytlar)
+
+        Kutilayotgan so'rovlar saqlanadi; kanal ma'lumotlari faqat admin uni
+        o'chirgan bo'lsa (tombstone) o'chiriladi, ro'yxatda yo'qligi yetarli emas.
+        """
+        storage = get_storage()
+        registry = get_channel_registry()
+        # Boshqa jarayonlar hozirgina qo'shgan kanallar ham ko'rinsin (TTL kutilmaydi)
+        registry.invalidate()
+        deleted = {
+            channel_id: deleted_at for channel_id, deleted_at in storage.deleted_channels().items()
+            if not registry.exists(channel_id)
+        }
+        before = (datetime.now() - timedelta(days=retention_days)).timestamp()
+
+        size_before = storage.storage_size()
+        removed, dropped = storage.purge(before, deleted)
+        storage.forget_deleted_channels(set(deleted))
+        get_pending_index().drop_channels(dropped)
+        reclaimed = max(0, size_before - storage.storage_size())
+
+        logger.info(f"Tarix tozalandi: {removed} ta yozuv, {reclaimed} bayt")
+        return removed, reclaimed
+
+    @staticmethod
+    async def purge_history_async(retention_days: int) -> Tuple[int, int]:
+        # Alohida navbat: siqish va VACUUM join so'rovlar yozilishini ushlab turmaydi
+        return await run_io(UserManager.purge_history, retention_days, lock_key="purge")
+
+    @staticmethod
+    async def add_join_request_async(user_id: int, channel_id: str):
+        await run_io(
+            UserManager.add_join_request, user_id, channel_id, lock_key=f"requests:{channel_id}"
+        )
+
+    @staticmethod
+    async def set_statuses_async(channel_id: str, statuses: Dict[int, str]):
+        await run_io(
+            UserManager.set_statuses, channel_id, statuses, lock_key=f"requests:{channel_id}"
+        )
+
+if __name__ == "__main__":
+    # python storage.py migrate - JSON fayllarni SQLite ga ko'chirish
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    if sys.argv[1:] != ["migrate"]:
+        print("Foydalanish: python storage.py migrate")
+        sys.exit(1)
+
+    target = SqliteStorage()
+    if not target.is_empty():
+        print(f"❌ {SQLITE_FILE} bo'sh emas, ko'chirish bekor qilindi.")
+        sys.exit(1)
+    source = JsonStorage()
+    migrate_json_to_sqlite(source, target)
+    source.close()
+    target.close()